@@ -2,13 +2,9 @@
 from argparse import ArgumentParser
 from collections import Counter
 import os
+import time
 
-
-parser = ArgumentParser()
-parser.add_argument('fpred')
-parser.add_argument('fgold')
-parser.add_argument('--verbose', action='store_true')
-args = parser.parse_args()
+import numpy as np
 
 
 def load_pred(fname, force_limit=None):
@@ -22,24 +18,111 @@ def load_pred(fname, force_limit=None):
         return loaded
 
 
-pred = load_pred(args.fpred, force_limit=3)
-gold = load_pred(args.fgold)
+def _codes(strings, width):
+    """Code points of `strings`, each padded with NULs to `width`, as an (n, width) array."""
+    joined = ''.join(s.ljust(width, '\0') for s in strings)
+    return np.frombuffer(joined.encode('utf-32-le'), dtype=np.uint32).reshape(len(strings), width)
+
+
+def grade(pred, gold, lang, limit=3, top_missed=10):
+    """
+    Score lowercased predictions against gold next characters, the same way as the command line
+    grader: a line is right when its gold string occurs in the prediction. Returns a dict with the
+    per-line `right` mask and `position` of the gold character (-1 when wrong), per-language
+    `correct`/`total` and `at_position` counts (languages in order of first appearance), and the
+    `missed` gold characters most often not guessed.
+    """
+    if len(pred) < len(gold):
+        pred = pred + [''] * (len(gold) - len(pred))
+    n = min(len(pred), len(gold), len(lang))
+    pred, gold, lang = [p[:limit] for p in pred[:n]], gold[:n], lang[:n]
+
+    single = np.array([len(g) == 1 for g in gold], dtype=bool)
+    pred_codes = _codes(pred, limit)
+    filled = np.arange(limit) < np.array([len(p) for p in pred])[:, None]
+    gold_codes = _codes([g if len(g) == 1 else '' for g in gold], 1)[:, 0]
+    hits = (pred_codes == gold_codes[:, None]) & filled & single[:, None]
+    right = hits.any(axis=1)
+    position = np.where(right, hits.argmax(axis=1), -1)
+    # empty or multi-character gold lines keep plain substring semantics
+    for i in np.flatnonzero(~single):
+        position[i] = pred[i].find(gold[i])
+        right[i] = position[i] >= 0
+
+    langs, first, lang_idx = np.unique(np.array(lang, dtype=object), return_index=True, return_inverse=True)
+    order = np.argsort(first)
+    n_langs = len(langs)
+    total = np.bincount(lang_idx, minlength=n_langs)
+    correct = np.bincount(lang_idx[right], minlength=n_langs)
+    at_position = np.stack([np.bincount(lang_idx[position == j], minlength=n_langs) for j in range(limit)], axis=1)
+
+    missed = Counter(gold[i] for i in np.flatnonzero(~right & ~single))
+    wrong_codes, wrong_counts = np.unique(gold_codes[~right & single], return_counts=True)
+    missed.update({chr(c): int(k) for c, k in zip(wrong_codes, wrong_counts)})
+
+    return {
+        'right': right,
+        'position': position,
+        'by_lang': {str(langs[i]): {'correct': int(correct[i]), 'total': int(total[i]),
+                                    'at_position': at_position[i].tolist()} for i in order},
+        'missed': missed.most_common(top_missed),
+    }
+
+
+def grade_files(fpred, fgold, flang=None, **kwargs):
+    """`grade` on files; the language file defaults to lang.txt next to the gold answers."""
+    if flang is None:
+        flang = os.path.join(os.path.dirname(fgold), 'lang.txt')
+    return grade(load_pred(fpred, force_limit=3), load_pred(fgold), load_pred(flang), **kwargs)
+
+
+def format_report(report):
+    lines = []
+    for k, v in report['by_lang'].items():
+        lines.append(f'Success rate for {k}: {v["correct"]}/{v["total"]} = {v["correct"]/v["total"]}')
+
+    limit = len(next(iter(report['by_lang'].values()))['at_position']) if report['by_lang'] else 0
+    lines.append('')
+    lines.append('lang  ' + ''.join(f'{"top-" + str(j + 1):>8}' for j in range(limit)) + f'{"lines":>8}')
+    all_total = sum(v['total'] for v in report['by_lang'].values())
+    all_at = np.zeros(limit, dtype=np.int64)
+    for k, v in report['by_lang'].items():
+        cumulative = np.cumsum(v['at_position'])
+        all_at += v['at_position']
+        lines.append(f'{k:<6}' + ''.join(f'{c / v["total"]:>8.4f}' for c in cumulative) + f'{v["total"]:>8}')
+    if all_total:
+        lines.append(f'{"all":<6}' + ''.join(f'{c / all_total:>8.4f}' for c in np.cumsum(all_at)) + f'{all_total:>8}')
+
+    lines.append('')
+    lines.append('Most frequently missed characters:')
+    for ch, count in report['missed']:
+        lines.append(f'  {ch!r}: {count}')
+    return '\n'.join(lines)
+
+
+def main():
+    parser = ArgumentParser()
+    parser.add_argument('fpred')
+    parser.add_argument('fgold')
+    parser.add_argument('--verbose', action='store_true')
+    args = parser.parse_args()
 
-flang = os.path.join(os.path.dirname(args.fgold), 'lang.txt')
-lang = load_pred(flang)
+    pred = load_pred(args.fpred, force_limit=3)
+    gold = load_pred(args.fgold)
+    lang = load_pred(os.path.join(os.path.dirname(args.fgold), 'lang.txt'))
+    if len(pred) < len(gold):
+        pred.extend([''] * (len(gold) - len(pred)))
 
-if len(pred) < len(gold):
-    pred.extend([''] * (len(gold) - len(pred)))
+    start = time.perf_counter()
+    report = grade(pred, gold, lang)
+    elapsed = time.perf_counter() - start
 
-correct = Counter()
-total = Counter()
-for i, (p, g, l) in enumerate(zip(pred, gold, lang)):
-    right = g in p
-    correct[l] += right
-    total[l] += 1
     if args.verbose:
-        print('Input {}: {}, {} is {} in {}'.format(i, 'right' if right else 'wrong', g, 'in' if right else 'not in', p))
+        for i, (p, g, right) in enumerate(zip(pred, gold, report['right'])):
+            print('Input {}: {}, {} is {} in {}'.format(i, 'right' if right else 'wrong', g, 'in' if right else 'not in', p))
+    print(format_report(report))
+    print(f'Graded {len(report["right"])} lines in {elapsed:.3f}s')
 
 
-for k, v in correct.items():
-    print(f'Success rate for {k}: {v}/{total[k]} = {v/total[k]}')
+if __name__ == '__main__':
+    main()
@@ -2,15 +2,21 @@
 from __future__ import annotations
 
 import argparse
+import codecs
+import hashlib
+import http.client
 import json
+import os
 import re
 import sys
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
 from html.parser import HTMLParser
 from pathlib import Path
+from typing import Iterable, Iterator
 from urllib.error import HTTPError, URLError
 from urllib.parse import urldefrag, urljoin, urlparse
-from urllib.request import Request, urlopen
 
 USER_AGENT = (
     "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
@@ -18,6 +24,114 @@ USER_AGENT = (
     "Chrome/122.0.0.0 Safari/537.36"
 )
 HTML_EXTENSIONS = {"", ".html", ".htm", ".shtml", ".php", ".asp", ".aspx"}
+MAX_REDIRECTS = 5
+READ_CHUNK_SIZE = 64 * 1024
+MANIFEST_NAME = "scrape_manifest.json"
+JOURNAL_NAME = "scrape_manifest.jsonl"
+
+
+class TokenBucket:
+    """Thread-safe rate limiter: `rate` acquisitions per second, bursts of up to `capacity`."""
+
+    def __init__(self, rate: float, capacity: float = 1.0) -> None:
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self) -> None:
+        if self.rate <= 0:
+            return
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= 1
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0.0
+        # a negative balance reserves this caller's slot, so waiters are served in arrival order
+        if wait > 0:
+            time.sleep(wait)
+
+
+class ConnectionPool:
+    """Keep-alive HTTP(S) connections, one per host per thread, reused across requests."""
+
+    def __init__(self, timeout: float) -> None:
+        self.timeout = timeout
+        self.local = threading.local()
+
+    def _connection(self, scheme: str, netloc: str) -> http.client.HTTPConnection:
+        connections = self.local.__dict__.setdefault("connections", {})
+        conn = connections.get((scheme, netloc))
+        if conn is None:
+            conn_cls = http.client.HTTPSConnection if scheme == "https" else http.client.HTTPConnection
+            conn = conn_cls(netloc, timeout=self.timeout)
+            connections[(scheme, netloc)] = conn
+        return conn
+
+    def _discard(self, scheme: str, netloc: str) -> None:
+        conn = self.local.__dict__.get("connections", {}).pop((scheme, netloc), None)
+        if conn is not None:
+            conn.close()
+
+    def open(self, url: str, headers: dict[str, str]) -> tuple[int, http.client.HTTPMessage, Iterator[bytes]]:
+        """
+        GET url following redirects; returns (status, headers, body chunks). The chunks are read off
+        the socket as they are iterated and must be consumed before this thread's next request.
+        Raises URLError on I/O failure.
+        """
+        for _ in range(MAX_REDIRECTS + 1):
+            parsed = urlparse(url)
+            path = parsed.path or "/"
+            if parsed.query:
+                path += "?" + parsed.query
+            # a kept-alive connection may have been closed by the server: retry once on a fresh one
+            for attempt in range(2):
+                conn = self._connection(parsed.scheme, parsed.netloc)
+                try:
+                    conn.request("GET", path, headers={"User-Agent": USER_AGENT, **headers})
+                    response = conn.getresponse()
+                    break
+                except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError) as exc:
+                    self._discard(parsed.scheme, parsed.netloc)
+                    if attempt:
+                        raise URLError(exc) from exc
+                except (OSError, http.client.HTTPException) as exc:
+                    self._discard(parsed.scheme, parsed.netloc)
+                    if isinstance(exc, TimeoutError):
+                        raise
+                    raise URLError(exc) from exc
+            body = self._iter_body(response, parsed.scheme, parsed.netloc)
+            location = response.getheader("Location")
+            if response.status in (301, 302, 303, 307, 308) and location:
+                for _ in body:
+                    pass
+                url = urljoin(url, location)
+                continue
+            return response.status, response.msg, body
+        raise URLError(f"too many redirects: {url}")
+
+    def _iter_body(self, response: http.client.HTTPResponse, scheme: str, netloc: str) -> Iterator[bytes]:
+        finished = False
+        try:
+            while True:
+                try:
+                    chunk = response.read1(READ_CHUNK_SIZE)
+                except (OSError, http.client.HTTPException) as exc:
+                    if isinstance(exc, TimeoutError):
+                        raise
+                    raise URLError(exc) from exc
+                if not chunk:
+                    break
+                yield chunk
+            # read1 never marks a fully-read response closed, and the connection refuses new requests until it is
+            response.close()
+            finished = True
+        finally:
+            # a half-read response leaves the connection unusable
+            if not finished or response.will_close:
+                self._discard(scheme, netloc)
 
 
 class LiLinkExtractor(HTMLParser):
@@ -86,7 +200,10 @@ class PlainTextExtractor(HTMLParser):
     def __init__(self) -> None:
         super().__init__(convert_charrefs=True)
         self.skip_depth = 0
-        self.parts: list[str] = []
+        # words of the line being built; `glue` means the next fragment continues the last word
+        self.words: list[str] = []
+        self.glue = False
+        self.lines: list[str] = []
 
     def handle_starttag(self, tag: str, attrs: list[tuple[str, str | None]]) -> None:
         tag = tag.lower()
@@ -94,7 +211,7 @@ class PlainTextExtractor(HTMLParser):
             self.skip_depth += 1
             return
         if self.skip_depth == 0 and tag in self.BLOCK_TAGS:
-            self.parts.append("\n")
+            self.end_line()
 
     def handle_endtag(self, tag: str) -> None:
         tag = tag.lower()
@@ -102,16 +219,41 @@ class PlainTextExtractor(HTMLParser):
             self.skip_depth -= 1
             return
         if self.skip_depth == 0 and tag in self.BLOCK_TAGS:
-            self.parts.append("\n")
+            self.end_line()
 
     def handle_data(self, data: str) -> None:
-        if self.skip_depth == 0:
-            self.parts.append(data)
+        if self.skip_depth:
+            return
+        pieces = data.splitlines(keepends=True)
+        for piece in pieces:
+            text = piece.splitlines()[0]
+            self.add_words(text)
+            if len(text) < len(piece):
+                self.end_line()
+
+    def add_words(self, text: str) -> None:
+        if not text:
+            return
+        words = text.split()
+        if words and self.glue and not text[0].isspace():
+            self.words[-1] += words.pop(0)
+        self.words.extend(words)
+        self.glue = bool(self.words) and not text[-1].isspace()
+
+    def end_line(self) -> None:
+        if self.words:
+            self.lines.append(" ".join(self.words))
+            self.words = []
+        self.glue = False
 
-    def get_text(self) -> str:
-        raw_text = "".join(self.parts)
-        lines = [re.sub(r"\s+", " ", line).strip() for line in raw_text.splitlines()]
-        return "\n".join(line for line in lines if line)
+    def pop_lines(self) -> list[str]:
+        """Lines finished since the last call, whitespace-normalized, empty lines dropped."""
+        lines, self.lines = self.lines, []
+        return lines
+
+    def close(self) -> None:
+        super().close()
+        self.end_line()
 
 
 def read_urls(urls_file: Path) -> list[str]:
@@ -123,15 +265,144 @@ def read_urls(urls_file: Path) -> list[str]:
     return urls
 
 
-def fetch_html(url: str, timeout: float) -> str:
-    req = Request(url, headers={"User-Agent": USER_AGENT})
-    with urlopen(req, timeout=timeout) as response:
-        body = response.read()
-        charset = response.headers.get_content_charset() or "utf-8"
+class ResponseCache:
+    """
+    On-disk HTTP cache keyed by URL hash: <key>.json holds the URL, ETag, Last-Modified and charset,
+    <key>.body the raw response body and <key>.text the plain text extracted from it, if any.
+    """
+
+    def __init__(self, root: Path) -> None:
+        self.root = root
+        self.root.mkdir(parents=True, exist_ok=True)
+
+    def _path(self, url: str, suffix: str) -> Path:
+        return self.root / (hashlib.sha256(url.encode("utf-8")).hexdigest() + suffix)
+
+    @staticmethod
+    def _tmp_path(path: Path) -> Path:
+        return path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+
+    def _write(self, path: Path, data: bytes) -> None:
+        tmp_path = self._tmp_path(path)
+        tmp_path.write_bytes(data)
+        tmp_path.replace(path)
+
+    def meta(self, url: str) -> dict[str, str] | None:
+        path = self._path(url, ".json")
+        if not path.exists():
+            return None
+        return json.loads(path.read_text(encoding="utf-8"))
+
+    def validators(self, url: str) -> dict[str, str]:
+        meta = self.meta(url) or {}
+        headers = {}
+        if meta.get("etag"):
+            headers["If-None-Match"] = meta["etag"]
+        if meta.get("last_modified"):
+            headers["If-Modified-Since"] = meta["last_modified"]
+        return headers
+
+    def load(self, url: str) -> tuple[Iterator[bytes], str]:
+        """(body chunks, charset) of the cached response."""
+        meta = self.meta(url)
+        if meta is None:
+            raise URLError(f"not in cache: {url}")
+        return self._iter_file(self._path(url, ".body")), meta["charset"]
+
+    @staticmethod
+    def _iter_file(path: Path) -> Iterator[bytes]:
+        with path.open("rb") as f:
+            while chunk := f.read(READ_CHUNK_SIZE):
+                yield chunk
+
+    def store(
+        self, url: str, headers: http.client.HTTPMessage, charset: str, chunks: Iterable[bytes]
+    ) -> Iterator[bytes]:
+        """Pass `chunks` through while writing them to the cache; the entry is replaced once they run out."""
+        body_path = self._path(url, ".body")
+        tmp_path = self._tmp_path(body_path)
+        try:
+            with tmp_path.open("wb") as f:
+                for chunk in chunks:
+                    f.write(chunk)
+                    yield chunk
+        except BaseException:
+            tmp_path.unlink(missing_ok=True)
+            raise
+        self._path(url, ".text").unlink(missing_ok=True)
+        tmp_path.replace(body_path)
+        meta = {
+            "url": url,
+            "etag": headers.get("ETag"),
+            "last_modified": headers.get("Last-Modified"),
+            "charset": charset,
+        }
+        self._write(self._path(url, ".json"), json.dumps(meta, indent=2).encode("utf-8"))
+
+    def load_text(self, url: str) -> str | None:
+        path = self._path(url, ".text")
+        return path.read_text(encoding="utf-8") if path.exists() else None
+
+    def store_text(self, url: str, text: str) -> None:
+        self._write(self._path(url, ".text"), text.encode("utf-8"))
+
+
+def conditional_get(
+    url: str,
+    pool: ConnectionPool,
+    limiter: TokenBucket | None = None,
+    cache: ResponseCache | None = None,
+    offline: bool = False,
+) -> tuple[Iterator[bytes], str] | None:
+    """
+    Start fetching url: (body chunks, charset), or None when the cached copy is current (304, or
+    offline and cached). A fresh body is written to the cache as its chunks are consumed.
+    """
+    if cache is not None and offline:
+        if cache.meta(url) is None:
+            raise URLError(f"not in cache (offline): {url}")
+        return None
+    if limiter is not None:
+        limiter.acquire()
+    status, headers, chunks = pool.open(url, cache.validators(url) if cache is not None else {})
+    if status == 304 and cache is not None and cache.meta(url) is not None:
+        for _ in chunks:
+            pass
+        return None
+    if status >= 400:
+        for _ in chunks:
+            pass
+        raise HTTPError(url, status, http.client.responses.get(status, ""), headers, None)
+    charset = headers.get_content_charset() or "utf-8"
+    if cache is not None:
+        chunks = cache.store(url, headers, charset, chunks)
+    return chunks, charset
+
+
+def decode_chunks(chunks: Iterable[bytes], charset: str) -> Iterator[str]:
     try:
-        return body.decode(charset, errors="replace")
+        decoder = codecs.getincrementaldecoder(charset)(errors="replace")
     except LookupError:
-        return body.decode("utf-8", errors="replace")
+        decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    for chunk in chunks:
+        text = decoder.decode(chunk)
+        if text:
+            yield text
+    text = decoder.decode(b"", final=True)
+    if text:
+        yield text
+
+
+def fetch_html(
+    url: str,
+    pool: ConnectionPool,
+    limiter: TokenBucket | None = None,
+    cache: ResponseCache | None = None,
+    offline: bool = False,
+) -> Iterator[str]:
+    """Decoded chunks of the page, streamed from the socket (or the cache) as they are iterated."""
+    fresh = conditional_get(url, pool, limiter, cache, offline)
+    return decode_chunks(*(fresh if fresh is not None else cache.load(url)))
 
 
 def normalize_link(base_url: str, href: str) -> str | None:
@@ -155,9 +426,11 @@ def is_probably_html(url: str) -> bool:
     return suffix in HTML_EXTENSIONS
 
 
-def extract_second_layer_links(main_url: str, html: str) -> list[str]:
+def extract_second_layer_links(main_url: str, html: Iterable[str]) -> list[str]:
     parser = LiLinkExtractor()
-    parser.feed(html)
+    for chunk in html:
+        parser.feed(chunk)
+    parser.close()
 
     unique_links: list[str] = []
     seen: set[str] = set()
@@ -172,10 +445,28 @@ def extract_second_layer_links(main_url: str, html: str) -> list[str]:
     return unique_links
 
 
-def extract_plain_text(html: str) -> str:
+def iter_plain_text(html: Iterable[str]) -> Iterator[str]:
+    """Lines of plain text, yielded as soon as each is complete while `html` is still arriving."""
     parser = PlainTextExtractor()
-    parser.feed(html)
-    return parser.get_text()
+    for chunk in html:
+        parser.feed(chunk)
+        yield from parser.pop_lines()
+    parser.close()
+    yield from parser.pop_lines()
+
+
+def extract_plain_text(html: Iterable[str]) -> str:
+    return "\n".join(iter_plain_text(html))
+
+
+def fetch_second_layer_links(
+    main_url: str,
+    pool: ConnectionPool,
+    limiter: TokenBucket | None = None,
+    cache: ResponseCache | None = None,
+    offline: bool = False,
+) -> list[str]:
+    return extract_second_layer_links(main_url, fetch_html(main_url, pool, limiter, cache, offline))
 
 
 def safe_name(value: str) -> str:
@@ -196,74 +487,172 @@ def build_output_path(mission_dir: Path, index: int, transcript_url: str) -> Pat
     parsed = urlparse(transcript_url)
     stem = Path(parsed.path).stem or "index"
     base = f"{index:03d}_{safe_name(stem)}"
-    candidate = mission_dir / f"{base}.txt"
-    serial = 2
-    while candidate.exists():
-        candidate = mission_dir / f"{base}_{serial}.txt"
-        serial += 1
-    return candidate
+    # the index already makes names unique within a mission, so re-runs overwrite rather than pile up copies
+    return mission_dir / f"{base}.txt"
+
+
+def sha256_bytes(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def write_atomic(path: Path, data: bytes) -> None:
+    tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    tmp_path.write_bytes(data)
+    tmp_path.replace(path)
+
+
+class ScrapeJournal:
+    """
+    Append-only JSON-lines record of saved transcripts, one entry per line with the file's sha256.
+    Every entry is flushed to disk as soon as its file is written, so an interrupted scrape keeps
+    its bookkeeping and `--resume` can skip pages that are already saved intact.
+    """
+
+    def __init__(self, path: Path, resume: bool = False) -> None:
+        self.path = path
+        self.entries: dict[str, dict[str, str]] = self._read() if resume else {}
+        self.handle = path.open("a" if resume else "w", encoding="utf-8")
+        # a crash can leave a torn last line; start the next entry on a fresh one
+        if resume and path.stat().st_size and not path.read_bytes().endswith(b"\n"):
+            self.handle.write("\n")
+
+    def _read(self) -> dict[str, dict[str, str]]:
+        entries: dict[str, dict[str, str]] = {}
+        if not self.path.exists():
+            return entries
+        for line in self.path.read_text(encoding="utf-8").splitlines():
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            entries[entry["transcript_url"]] = entry
+        return entries
+
+    def completed(self, transcript_url: str, output_path: Path) -> dict[str, str] | None:
+        """The journal entry for `transcript_url` if it was saved to `output_path` and the file is unchanged."""
+        entry = self.entries.get(transcript_url)
+        if entry is None or entry["output_file"] != output_path.as_posix() or not output_path.exists():
+            return None
+        if sha256_bytes(output_path.read_bytes()) != entry["sha256"]:
+            return None
+        return entry
+
+    def record(self, entry: dict[str, str]) -> None:
+        self.handle.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        self.handle.flush()
+        os.fsync(self.handle.fileno())
+        self.entries[entry["transcript_url"]] = entry
+
+    def close(self) -> None:
+        self.handle.close()
+
+
+def fetch_transcript(
+    url: str,
+    pool: ConnectionPool,
+    limiter: TokenBucket,
+    cache: ResponseCache | None = None,
+    offline: bool = False,
+) -> str:
+    """Plain text of a transcript page; an unchanged cached page reuses its extracted text."""
+    fresh = conditional_get(url, pool, limiter, cache, offline)
+    if fresh is None:
+        text = cache.load_text(url)
+        if text is not None:
+            return text
+        fresh = cache.load(url)
+    text = extract_plain_text(decode_chunks(*fresh))
+    if cache is not None:
+        cache.store_text(url, text)
+    return text
 
 
 def scrape(
     main_urls: list[str],
     output_dir: Path,
     timeout: float,
-    delay_seconds: float,
+    rate: float,
+    concurrency: int,
     max_links_per_main: int | None,
+    cache: ResponseCache | None = None,
+    offline: bool = False,
+    resume: bool = False,
 ) -> int:
     output_dir.mkdir(parents=True, exist_ok=True)
+    journal = ScrapeJournal(output_dir / JOURNAL_NAME, resume=resume)
     manifest: list[dict[str, str]] = []
     total_saved = 0
-
-    for main_url in main_urls:
-        print(f"[main] {main_url}")
-        try:
-            main_html = fetch_html(main_url, timeout=timeout)
-        except (HTTPError, URLError, TimeoutError) as exc:
-            print(f"  ! failed to fetch main page: {exc}", file=sys.stderr)
-            continue
-
-        links = extract_second_layer_links(main_url, main_html)
-        if max_links_per_main is not None:
-            links = links[:max_links_per_main]
-        print(f"  - second-layer links found: {len(links)}")
-
-        mission_dir = output_dir / mission_name_from_url(main_url)
-        mission_dir.mkdir(parents=True, exist_ok=True)
-
-        for idx, transcript_url in enumerate(links, start=1):
+    total_kept = 0
+    pool = ConnectionPool(timeout=timeout)
+    limiter = TokenBucket(rate=rate, capacity=max(1, concurrency))
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        main_pages = [
+            executor.submit(fetch_second_layer_links, main_url, pool, limiter, cache, offline) for main_url in main_urls
+        ]
+
+        # queue every mission's transcripts before saving any, so fetching never waits on disk writes
+        missions = []
+        for main_url, main_page in zip(main_urls, main_pages):
+            print(f"[main] {main_url}")
             try:
-                transcript_html = fetch_html(transcript_url, timeout=timeout)
+                links = main_page.result()
             except (HTTPError, URLError, TimeoutError) as exc:
-                print(f"    ! failed: {transcript_url} ({exc})", file=sys.stderr)
+                print(f"  ! failed to fetch main page: {exc}", file=sys.stderr)
                 continue
 
-            text = extract_plain_text(transcript_html)
-            if not text:
-                print(f"    ! empty text: {transcript_url}", file=sys.stderr)
-                continue
-
-            output_path = build_output_path(mission_dir, idx, transcript_url)
-            output_path.write_text(text + "\n", encoding="utf-8")
-            total_saved += 1
-
-            manifest.append(
-                {
+            if max_links_per_main is not None:
+                links = links[:max_links_per_main]
+            print(f"  - second-layer links found: {len(links)}")
+            mission_dir = output_dir / mission_name_from_url(main_url)
+            texts = []
+            for idx, link in enumerate(links, start=1):
+                done = journal.completed(link, build_output_path(mission_dir, idx, link))
+                texts.append(done or executor.submit(fetch_transcript, link, pool, limiter, cache, offline))
+            missions.append((main_url, mission_dir, links, texts))
+
+        for main_url, mission_dir, links, texts in missions:
+            mission_dir.mkdir(parents=True, exist_ok=True)
+
+            for idx, (transcript_url, text_future) in enumerate(zip(links, texts), start=1):
+                if isinstance(text_future, dict):
+                    manifest.append({key: text_future[key] for key in ("main_url", "transcript_url", "output_file")})
+                    total_kept += 1
+                    print(f"    = kept {text_future['output_file']}")
+                    continue
+                try:
+                    text = text_future.result()
+                except (HTTPError, URLError, TimeoutError) as exc:
+                    print(f"    ! failed: {transcript_url} ({exc})", file=sys.stderr)
+                    continue
+
+                if not text:
+                    print(f"    ! empty text: {transcript_url}", file=sys.stderr)
+                    continue
+
+                output_path = build_output_path(mission_dir, idx, transcript_url)
+                data = (text + "\n").encode("utf-8")
+                write_atomic(output_path, data)
+                total_saved += 1
+
+                entry = {
                     "main_url": main_url,
                     "transcript_url": transcript_url,
                     "output_file": str(output_path.as_posix()),
                 }
-            )
-            print(f"    + saved {output_path}")
-            if delay_seconds > 0:
-                time.sleep(delay_seconds)
+                manifest.append(entry)
+                journal.record({**entry, "sha256": sha256_bytes(data)})
+                print(f"    + saved {output_path}")
 
-    manifest_path = output_dir / "scrape_manifest.json"
+    journal.close()
+    manifest_path = output_dir / MANIFEST_NAME
     manifest_path.write_text(
         json.dumps(manifest, indent=2, ensure_ascii=False) + "\n",
         encoding="utf-8",
     )
     print(f"[done] saved {total_saved} transcript files")
+    if resume:
+        print(f"[done] kept {total_kept} already-saved transcript files")
     print(f"[done] manifest: {manifest_path}")
     return total_saved
 
@@ -294,10 +683,37 @@ def parse_args() -> argparse.Namespace:
         help="HTTP timeout per request in seconds.",
     )
     parser.add_argument(
-        "--delay-seconds",
+        "--rate",
         type=float,
-        default=0.2,
-        help="Delay between transcript-page requests.",
+        default=5.0,
+        help="Maximum requests per second across all workers (0 for no limit).",
+    )
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=4,
+        help="Number of pages fetched in parallel.",
+    )
+    parser.add_argument(
+        "--cache-dir",
+        type=Path,
+        default=None,
+        help="HTTP response cache directory (default: <output-dir>/http-cache).",
+    )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Always download full pages and do not update the cache.",
+    )
+    parser.add_argument(
+        "--offline",
+        action="store_true",
+        help="Rebuild transcript text purely from the cache, without network access.",
+    )
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help=f"Continue an interrupted scrape: skip pages recorded in {JOURNAL_NAME} whose files are intact.",
     )
     parser.add_argument(
         "--max-links-per-main",
@@ -318,13 +734,21 @@ def main() -> int:
     if not main_urls:
         print(f"No URLs found in: {args.urls_file}", file=sys.stderr)
         return 1
+    if args.offline and args.no_cache:
+        print("--offline needs the cache; drop --no-cache", file=sys.stderr)
+        return 1
 
+    cache = None if args.no_cache else ResponseCache(args.cache_dir or args.output_dir / "http-cache")
     scrape(
         main_urls=main_urls,
         output_dir=args.output_dir,
         timeout=args.timeout,
-        delay_seconds=args.delay_seconds,
+        rate=args.rate,
+        concurrency=args.concurrency,
         max_links_per_main=args.max_links_per_main,
+        cache=cache,
+        offline=args.offline,
+        resume=args.resume,
     )
     return 0
 
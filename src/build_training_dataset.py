@@ -1,6 +1,21 @@
 from argparse import ArgumentParser
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from hashlib import blake2b
+from itertools import islice
+import os
 from pathlib import Path
 
+import numpy as np
+
+DEDUP_MODES = ("exact", "hash64", "hash128")
+BATCH_SIZE = 1 << 16
+NEAR_DUP_SHARD_SIZE = 1 << 13
+MINHASH_SEED = 20240229
+SHINGLE_MUL = np.uint64(0x100000001B3)
+MIX_MUL1 = np.uint64(0xFF51AFD7ED558CCD)
+MIX_MUL2 = np.uint64(0xC4CEB9FE1A85EC53)
+
 
 def iter_files(root: Path):
     for path in sorted(root.rglob("*")):
@@ -13,36 +28,255 @@ def normalize_sentence(line: str) -> str:
     return " ".join(line.strip().split())
 
 
-def build_dataset(input_dirs: list[Path], output_path: Path) -> tuple[int, int]:
-    seen = set()
-    unique_sentences = []
-    total_sentences = 0
-
+def iter_input_files(input_dirs: list[Path]):
     for input_dir in input_dirs:
-        if not input_dir.exists():
-            continue
+        if input_dir.exists():
+            yield from iter_files(input_dir)
+
+
+def iter_file_sentences(file_path: Path):
+    with file_path.open("r", encoding="utf-8", errors="ignore") as infile:
+        for raw_line in infile:
+            sentence = normalize_sentence(raw_line)
+            if sentence:
+                yield sentence
+
+
+def iter_sentences(input_dirs: list[Path]):
+    for file_path in iter_input_files(input_dirs):
+        yield from iter_file_sentences(file_path)
+
+
+def dedup_file(file_path: Path) -> tuple[int, list[str]]:
+    """Map step: (sentences read, distinct sentences in order of first occurrence) for one file."""
+    sentences = list(iter_file_sentences(file_path))
+    return len(sentences), ExactSeen().add_batch(sentences)
+
+
+def map_ordered(fn, tasks, workers: int | None = None, mp_context=None):
+    """
+    Yield fn(task) for each task, computed in a process pool but in task order, with bounded
+    read-ahead. `mp_context` picks how workers are started, as for ProcessPoolExecutor.
+    """
+    max_pending = 2 * (workers or os.cpu_count() or 1)
+    with ProcessPoolExecutor(max_workers=workers, mp_context=mp_context) as pool:
+        pending = deque()
+        for task in tasks:
+            pending.append(pool.submit(fn, *task))
+            if len(pending) >= max_pending:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def iter_batches(items, size: int):
+    items = iter(items)
+    while batch := list(islice(items, size)):
+        yield batch
+
+
+class ExactSeen:
+    """Remembers every sentence verbatim."""
+
+    def __init__(self):
+        self.seen = set()
+
+    def add_batch(self, sentences: list[str]) -> list[str]:
+        """Add a batch and return its sentences not seen before, first occurrences only, in order."""
+        new_sentences = []
+        for sentence in sentences:
+            if sentence not in self.seen:
+                self.seen.add(sentence)
+                new_sentences.append(sentence)
+        return new_sentences
+
+
+class HashedSeen:
+    """
+    Remembers only a fixed-size blake2b hash per sentence (8 or 16 bytes), kept in sorted numpy runs
+    that are merged log-structured style, so lookups are a binary search per run. Distinct sentences
+    whose hashes collide are treated as duplicates: about n**2 / 2**(bits + 1) expected collisions.
+    """
+
+    def __init__(self, bits: int = 64):
+        self.digest_size = bits // 8
+        self.dtype = np.dtype("<u8") if bits == 64 else np.dtype(f"S{self.digest_size}")
+        self.runs = []
+
+    def __len__(self):
+        return sum(len(run) for run in self.runs)
+
+    def hashes(self, sentences: list[str]) -> np.ndarray:
+        digests = b"".join(blake2b(s.encode("utf-8"), digest_size=self.digest_size).digest() for s in sentences)
+        return np.frombuffer(digests, dtype=self.dtype)
+
+    def contains(self, keys: np.ndarray) -> np.ndarray:
+        found = np.zeros(len(keys), dtype=bool)
+        for run in self.runs:
+            pos = np.minimum(np.searchsorted(run, keys), len(run) - 1)
+            found |= run[pos] == keys
+        return found
+
+    def add_batch(self, sentences: list[str]) -> list[str]:
+        """Add a batch and return its sentences not seen before, first occurrences only, in order."""
+        keys = self.hashes(sentences)
+        _, first = np.unique(keys, return_index=True)
+        first = np.sort(first)
+        first = first[~self.contains(keys[first])]
+        if len(first):
+            self.runs.append(np.sort(keys[first]))
+            # merge runs of similar size so there are only O(log n) of them
+            while len(self.runs) > 1 and len(self.runs[-2]) <= 2 * len(self.runs[-1]):
+                merged = np.concatenate(self.runs[-2:])
+                merged.sort(kind="stable")
+                self.runs[-2:] = [merged]
+        return [sentences[i] for i in first]
 
-        for file_path in iter_files(input_dir):
-            with file_path.open("r", encoding="utf-8", errors="ignore") as infile:
-                for raw_line in infile:
-                    sentence = normalize_sentence(raw_line)
-                    if not sentence:
-                        continue
 
-                    total_sentences += 1
-                    if sentence in seen:
-                        continue
+def make_seen(dedup: str):
+    if dedup == "exact":
+        return ExactSeen()
+    if dedup in ("hash64", "hash128"):
+        return HashedSeen(bits=int(dedup[len("hash"):]))
+    raise ValueError(f"unknown dedup mode: {dedup}")
 
-                    seen.add(sentence)
-                    unique_sentences.append(sentence)
+
+def build_dataset(
+    input_dirs: list[Path], output_path: Path, dedup: str = "exact", workers: int | None = 1, mp_context=None
+) -> tuple[int, int]:
+    """
+    Write each distinct normalized sentence once, in order of first occurrence. Sentences are
+    streamed to the output in batches; `dedup` picks what is remembered between batches, either
+    the sentences themselves ("exact") or only their 64/128-bit hashes ("hash64"/"hash128").
+    With more than one worker, files are normalized and deduplicated locally in a process pool
+    and merged in file order, which gives the same output as the serial run.
+    """
+    if (workers or os.cpu_count() or 1) == 1:
+        batches = ((len(batch), batch) for batch in iter_batches(iter_sentences(input_dirs), BATCH_SIZE))
+    else:
+        batches = map_ordered(dedup_file, ((path,) for path in iter_input_files(input_dirs)), workers, mp_context)
+    return write_dataset(batches, output_path, dedup)
+
+
+def build_dataset_from_texts(texts, output_path: Path, dedup: str = "exact") -> tuple[int, int]:
+    """
+    build_dataset over an iterable of lines instead of input directories, e.g. the utterances the
+    cleaners yield, so nothing has to be written to and re-read from intermediate files.
+    """
+    sentences = (sentence for sentence in map(normalize_sentence, texts) if sentence)
+    batches = ((len(batch), batch) for batch in iter_batches(sentences, BATCH_SIZE))
+    return write_dataset(batches, output_path, dedup)
+
+
+def write_dataset(batches, output_path: Path, dedup: str = "exact") -> tuple[int, int]:
+    """Write the first occurrence of every sentence in `batches` of (sentences read, sentences)."""
+    seen = make_seen(dedup)
+    total_sentences = 0
+    unique_sentences = 0
 
     output_path.parent.mkdir(parents=True, exist_ok=True)
     with output_path.open("w", encoding="utf-8") as outfile:
-        outfile.write("\n".join(unique_sentences))
-        if unique_sentences:
-            outfile.write("\n")
+        for read, batch in batches:
+            total_sentences += read
+            new_sentences = seen.add_batch(batch)
+            unique_sentences += len(new_sentences)
+            outfile.writelines(sentence + "\n" for sentence in new_sentences)
+
+    return total_sentences, unique_sentences
+
+
+def mix64(keys: np.ndarray) -> np.ndarray:
+    keys = keys ^ (keys >> np.uint64(33))
+    keys = keys * MIX_MUL1
+    keys = keys ^ (keys >> np.uint64(33))
+    keys = keys * MIX_MUL2
+    return keys ^ (keys >> np.uint64(33))
+
+
+def minhash_signatures(sentences: list[str], shingle_size: int = 5, num_perm: int = 64) -> np.ndarray:
+    """
+    MinHash signatures of the character `shingle_size`-gram sets of `sentences`, as an
+    (n, num_perm) uint32 array. Sentences shorter than a shingle count as one NUL-padded shingle.
+    """
+    padded = [sentence.ljust(shingle_size, "\0") for sentence in sentences]
+    lengths = np.fromiter(map(len, padded), dtype=np.int64, count=len(padded))
+    codes = np.frombuffer("".join(padded).encode("utf-32-le"), dtype=np.uint32).astype(np.uint64)
+
+    n_windows = len(codes) - shingle_size + 1
+    window_hashes = np.zeros(n_windows, dtype=np.uint64)
+    for j in range(shingle_size):
+        window_hashes = window_hashes * SHINGLE_MUL + codes[j:j + n_windows] + np.uint64(1)
 
-    return total_sentences, len(unique_sentences)
+    # keep only the windows that lie inside one sentence
+    counts = lengths - shingle_size + 1
+    group_starts = np.cumsum(counts) - counts
+    offsets = np.arange(counts.sum()) - np.repeat(group_starts, counts)
+    shingles = mix64(window_hashes[np.repeat(np.cumsum(lengths) - lengths, counts) + offsets])
+
+    rng = np.random.default_rng(MINHASH_SEED)
+    mul = rng.integers(0, 1 << 63, size=num_perm, dtype=np.uint64) * np.uint64(2) + np.uint64(1)
+    add = rng.integers(0, 1 << 63, size=num_perm, dtype=np.uint64)
+    signatures = np.empty((len(sentences), num_perm), dtype=np.uint32)
+    for i in range(num_perm):
+        signatures[:, i] = np.minimum.reduceat((shingles * mul[i] + add[i]) >> np.uint64(32), group_starts)
+    return signatures
+
+
+def lsh_bands(num_perm: int, threshold: float) -> tuple[int, int]:
+    """(bands, rows) with bands * rows == num_perm whose LSH threshold (1/bands)**(1/rows) is closest to `threshold`."""
+    shapes = [(num_perm // rows, rows) for rows in range(1, num_perm + 1) if num_perm % rows == 0]
+    return min(shapes, key=lambda shape: abs((1 / shape[0]) ** (1 / shape[1]) - threshold))
+
+
+def near_duplicate_mask(signatures: np.ndarray, threshold: float) -> np.ndarray:
+    """
+    Mark sentences whose estimated Jaccard similarity to an earlier sentence is at least `threshold`.
+    Candidates come from LSH banding; each is compared with the earliest sentence of its bucket.
+    """
+    n, num_perm = signatures.shape
+    bands, rows = lsh_bands(num_perm, threshold)
+    duplicate = np.zeros(n, dtype=bool)
+    for band in range(bands):
+        keys = np.zeros(n, dtype=np.uint64)
+        for column in signatures[:, band * rows:(band + 1) * rows].T:
+            keys = keys * SHINGLE_MUL + column + np.uint64(1)
+        order = np.argsort(mix64(keys), kind="stable")
+        sorted_keys = keys[order]
+        first = np.ones(n, dtype=bool)
+        first[1:] = sorted_keys[1:] != sorted_keys[:-1]
+        earliest = order[np.maximum.accumulate(np.where(first, np.arange(n), 0))]
+        members, earliest = order[~first], earliest[~first]
+        similarity = (signatures[members] == signatures[earliest]).mean(axis=1)
+        duplicate[members[similarity >= threshold]] = True
+    return duplicate
+
+
+def remove_near_duplicates(
+    path: Path,
+    threshold: float,
+    shingle_size: int = 5,
+    num_perm: int = 64,
+    workers: int | None = None,
+    mp_context=None,
+) -> int:
+    """
+    Drop near-duplicate sentences from a one-sentence-per-line file in place, keeping the first of
+    each group. Signatures are computed in a process pool over shards of lines; only the signatures
+    are held in memory. Returns the number of sentences removed.
+    """
+    with path.open("r", encoding="utf-8") as infile:
+        shards = iter_batches((line.rstrip("\n") for line in infile), NEAR_DUP_SHARD_SIZE)
+        tasks = ((shard, shingle_size, num_perm) for shard in shards)
+        signatures = list(map_ordered(minhash_signatures, tasks, workers, mp_context))
+    if not signatures:
+        return 0
+    duplicate = near_duplicate_mask(np.concatenate(signatures), threshold)
+
+    tmp_path = path.with_name(path.name + ".tmp")
+    with path.open("r", encoding="utf-8") as infile, tmp_path.open("w", encoding="utf-8") as outfile:
+        outfile.writelines(line for line, drop in zip(infile, duplicate) if not drop)
+    tmp_path.replace(path)
+    return int(duplicate.sum())
 
 
 def parse_args():
@@ -62,16 +296,37 @@ def parse_args():
         default=Path("data/training_dataset.txt"),
         help="Output file path for deduplicated training text.",
     )
+    parser.add_argument(
+        "--dedup",
+        choices=DEDUP_MODES,
+        default="exact",
+        help="Remember seen sentences verbatim, or only as 64/128-bit hashes to bound memory.",
+    )
+    parser.add_argument(
+        "--near-dup-threshold",
+        type=float,
+        default=None,
+        help="Also drop sentences whose character-shingle Jaccard similarity to an earlier one is at least this.",
+    )
+    parser.add_argument("--shingle-size", type=int, default=5, help="Characters per shingle for near-dup detection.")
+    parser.add_argument("--num-perm", type=int, default=64, help="MinHash permutations per sentence.")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: CPU count).")
     return parser.parse_args()
 
 
 def main():
     args = parse_args()
-    total_sentences, unique_sentences = build_dataset(args.input, args.output)
+    total_sentences, unique_sentences = build_dataset(args.input, args.output, dedup=args.dedup, workers=args.workers)
     print(f"Output: {args.output}")
     print(f"Total sentences read: {total_sentences}")
     print(f"Unique sentences written: {unique_sentences}")
     print(f"Duplicates removed: {total_sentences - unique_sentences}")
+    if args.near_dup_threshold is not None:
+        near_duplicates = remove_near_duplicates(
+            args.output, args.near_dup_threshold, args.shingle_size, args.num_perm, args.workers
+        )
+        print(f"Near-duplicates removed: {near_duplicates}")
+        print(f"Sentences written: {unique_sentences - near_duplicates}")
 
 
 if __name__ == "__main__":
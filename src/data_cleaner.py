@@ -1,9 +1,16 @@
 import re
+from argparse import ArgumentParser
+from collections.abc import Iterable, Iterator
 from pathlib import Path
 
+import incremental
+
 
 INPUT_ROOT = Path("data/apollo-journals")
 OUTPUT_ROOT = Path("data/apollo-journals-clean")
+MANIFEST_PATH = incremental.STATE_DIR / "clean_journals_manifest.json"
+# Bump whenever a change to clean_file/normalize_text alters its output, so every file is re-cleaned.
+CLEANER_VERSION = 1
 
 # Match lines that begin with a mission timestamp + speaker.
 TIMESTAMP_SPEAKER_RE = re.compile(r"^\s*\d{1,3}:\d{2}:\d{2}\s+[^:]+:\s*(.*)$")
@@ -18,8 +25,27 @@ SPACE_BEFORE_PUNCT_RE = re.compile(r"\s+([,.;:!?])")
 LEADING_PUNCT_RE = re.compile(r"^[,.;:!?-]+\s*")
 ALNUM_RE = re.compile(r"[A-Za-z0-9]")
 
+SPACE_BEFORE_PUNCT_FAST_RE = re.compile(r" (?=[,.;:!?])")
+LEADING_PUNCT = frozenset(",.;:!?-")
+
 
 def normalize_text(text: str) -> str:
+    """
+    Drop [bracket annotations], collapse whitespace, remove spaces before punctuation and strip
+    leading punctuation. Same result as normalize_text_multipass, but whitespace is collapsed and
+    stripped by one str.split pass and the other rules only run when their trigger can occur.
+    """
+    if "[" in text:
+        text = BRACKET_ANNOTATION_RE.sub("", text)
+    text = " ".join(text.split())
+    text = SPACE_BEFORE_PUNCT_FAST_RE.sub("", text)
+    if text and text[0] in LEADING_PUNCT:
+        text = LEADING_PUNCT_RE.sub("", text, count=1)
+    return text
+
+
+def normalize_text_multipass(text: str) -> str:
+    """Reference implementation of normalize_text, one re.sub per rule."""
     text = BRACKET_ANNOTATION_RE.sub("", text)
     text = WHITESPACE_RE.sub(" ", text).strip()
     text = SPACE_BEFORE_PUNCT_RE.sub(r"\1", text)
@@ -27,65 +53,175 @@ def normalize_text(text: str) -> str:
     return text
 
 
-def clean_file(input_path: Path, output_path: Path) -> None:
-    output_path.parent.mkdir(parents=True, exist_ok=True)
-
-    cleaned_lines = []
-    with input_path.open("r", encoding="utf-8", errors="ignore") as infile:
-        lines = infile.readlines()
-
-    i = 0
-    while i < len(lines):
-        match = TIMESTAMP_SPEAKER_RE.match(lines[i])
-        if not match:
-            i += 1
-            continue
-
-        text = match.group(1).strip()
-        if not text:
-            j = i + 1
-            continuation_parts = []
-            while j < len(lines):
-                candidate = lines[j].strip()
-                if not candidate:
-                    j += 1
-                    continue
-                if TIMESTAMP_SPEAKER_RE.match(lines[j]):
-                    break
+def iter_utterances(lines: Iterable[str]) -> Iterator[str]:
+    """
+    Yield cleaned utterances from journal lines, reading each line once.
+
+    A timestamped speaker line with text is one utterance. A speaker line with no text starts a
+    continuation: the following lines are joined until a sentence ends, a non-dialogue line, the
+    next speaker line, or the end of input.
+    """
+    parts: list[str] | None = None  # not None while collecting a continuation
+    for line in lines:
+        match = TIMESTAMP_SPEAKER_RE.match(line)
+        if parts is not None:
+            candidate = line.strip()
+            if not candidate:
+                continue
+            if match is None:
                 if NON_DIALOGUE_LINE_RE.match(candidate):
-                    break
-
+                    yield from _finish_continuation(parts)
+                    parts = None
+                    continue
                 normalized_candidate = normalize_text(candidate)
                 if normalized_candidate and ALNUM_RE.search(normalized_candidate):
-                    continuation_parts.append(normalized_candidate)
+                    parts.append(normalized_candidate)
                     if SENTENCE_END_RE.search(candidate):
-                        break
-
-                j += 1
-
-            if continuation_parts:
-                text = " ".join(continuation_parts)
-                i = j
-
+                        yield from _finish_continuation(parts)
+                        parts = None
+                continue
+            if parts:
+                # The speaker line that ends a non-empty continuation is consumed with it; the
+                # published cleaned corpus depends on this, so it is kept.
+                yield from _finish_continuation(parts)
+                parts = None
+                continue
+            parts = None
+
+        if match is None:
+            continue
+        text = match.group(1).strip()
+        if not text:
+            parts = []
+            continue
         text = normalize_text(text)
         if text and ALNUM_RE.search(text):
-            cleaned_lines.append(text)
-
-        i += 1
-
-    if len(cleaned_lines) == 0:
-        return
-    with output_path.open("w", encoding="utf-8") as outfile:
-        outfile.write("\n".join(cleaned_lines))
-        if cleaned_lines:
-            outfile.write("\n")
+            yield text
+
+    if parts:
+        yield from _finish_continuation(parts)
+
+
+def _finish_continuation(parts: list[str]) -> Iterator[str]:
+    text = normalize_text(" ".join(parts))
+    if text and ALNUM_RE.search(text):
+        yield text
+
+
+def iter_file_utterances(input_path: Path, output_path: Path | None = None) -> Iterator[str]:
+    """
+    Yield the utterances of one journal, also writing them to output_path when given; the file is
+    only created if there are any.
+    """
+    outfile = None
+    try:
+        with input_path.open("r", encoding="utf-8", errors="ignore") as infile:
+            for text in iter_utterances(infile):
+                if output_path is not None:
+                    if outfile is None:
+                        output_path.parent.mkdir(parents=True, exist_ok=True)
+                        outfile = output_path.open("w", encoding="utf-8")
+                    outfile.write(text + "\n")
+                yield text
+    finally:
+        if outfile is not None:
+            outfile.close()
+
+
+def clean_file(input_path: Path, output_path: Path) -> int:
+    """Write the utterances of one journal to output_path, which is only created if there are any."""
+    return sum(1 for _ in iter_file_utterances(input_path, output_path))
+
+
+def iter_tree_utterances(input_root: Path, output_root: Path | None = None) -> Iterator[str]:
+    """
+    Yield the utterances of every journal under input_root, in the order build_training_dataset
+    reads the cleaned files; with output_root the cleaned files are written as well.
+    """
+    for input_path in sorted(input_root.rglob("*.txt")):
+        output_path = None if output_root is None else output_root / input_path.relative_to(input_root)
+        yield from iter_file_utterances(input_path, output_path)
+
+
+def clean_task(input_path: Path, output_path: Path) -> int:
+    lines = clean_file(input_path, output_path)
+    if lines == 0:
+        output_path.unlink(missing_ok=True)  # the input no longer yields any dialogue
+    return lines
+
+
+def clean_tree(
+    input_root: Path,
+    output_root: Path,
+    manifest_path: Path,
+    workers: int | None = None,
+    force: bool = False,
+    mp_context=None,
+) -> tuple[int, int]:
+    """Clean every changed journal under input_root in a process pool; returns (cleaned, skipped)."""
+    cleaned, current = incremental.update_tree(
+        input_root,
+        output_root,
+        sorted(input_root.rglob("*.txt")),
+        clean_task,
+        CLEANER_VERSION,
+        manifest_path,
+        workers,
+        force,
+        chunksize=4,
+        mp_context=mp_context,
+    )
+    return len(cleaned), len(current) - len(cleaned)
+
+
+def check_normalizer(input_root: Path) -> list[str]:
+    """
+    Golden check: run normalize_text and normalize_text_multipass on every string the cleaner can
+    normalize under input_root and return the inputs where they differ.
+    """
+    return incremental.golden_mismatches(_normalizer_inputs(input_root), normalize_text, normalize_text_multipass)
+
+
+def _normalizer_inputs(input_root: Path) -> Iterator[str]:
+    for input_path in sorted(input_root.rglob("*.txt")):
+        with input_path.open("r", encoding="utf-8", errors="ignore") as infile:
+            for line in infile:
+                yield line.strip()
+                match = TIMESTAMP_SPEAKER_RE.match(line)
+                if match:
+                    yield match.group(1).strip()
+
+
+def parse_args():
+    parser = ArgumentParser(description="Extract dialogue from scraped Apollo journal transcripts.")
+    parser.add_argument("--input-root", type=Path, default=INPUT_ROOT, help="Scraped journal text files.")
+    parser.add_argument("--output-root", type=Path, default=OUTPUT_ROOT, help="Where cleaned files are written.")
+    parser.add_argument(
+        "--manifest",
+        type=Path,
+        default=MANIFEST_PATH,
+        help="Manifest of cleaned inputs.",
+    )
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: CPU count).")
+    parser.add_argument("--force", action="store_true", help="Re-clean every file, ignoring the manifest.")
+    parser.add_argument(
+        "--check-normalizer",
+        action="store_true",
+        help="Compare normalize_text with the multi-pass reference on the whole input corpus and exit.",
+    )
+    return parser.parse_args()
 
 
 def main() -> None:
-    for input_path in INPUT_ROOT.rglob("*.txt"):
-        relative_path = input_path.relative_to(INPUT_ROOT)
-        output_path = OUTPUT_ROOT / relative_path
-        clean_file(input_path, output_path)
+    args = parse_args()
+    if args.check_normalizer:
+        mismatches = check_normalizer(args.input_root)
+        for text in mismatches[:20]:
+            print(f"MISMATCH: {text!r}")
+        print(f"{len(mismatches)} normalize_text mismatches under {args.input_root}")
+        raise SystemExit(1 if mismatches else 0)
+    cleaned, skipped = clean_tree(args.input_root, args.output_root, args.manifest, args.workers, args.force)
+    print(f"Cleaned {cleaned} files, skipped {skipped} unchanged files")
 
 
 if __name__ == "__main__":
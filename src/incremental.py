@@ -0,0 +1,124 @@
+import hashlib
+import json
+import os
+import time
+from collections.abc import Callable, Iterable
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from pathlib import Path
+
+
+# git-ignored home of cleaner manifests and pipeline state, kept out of the tracked data trees
+STATE_DIR = Path("data/.pipeline")
+
+
+def file_digest(path: Path) -> str:
+    digest = hashlib.sha256()
+    with path.open("rb") as infile:
+        for block in iter(lambda: infile.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def load_manifest(manifest_path: Path) -> dict[str, dict]:
+    if not manifest_path.exists():
+        return {}
+    return json.loads(manifest_path.read_text(encoding="utf-8"))
+
+
+def save_manifest(manifest_path: Path, manifest: dict[str, dict]) -> None:
+    manifest_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = manifest_path.with_name(manifest_path.name + ".tmp")
+    tmp_path.write_text(json.dumps(manifest, indent=2, sort_keys=True) + "\n", encoding="utf-8")
+    tmp_path.replace(manifest_path)
+
+
+def is_unchanged(
+    entry: dict | None, stat: os.stat_result, input_path: Path, output_path: Path, cleaner_version: int
+) -> bool:
+    """
+    Whether a manifest entry still describes this input and its cleaned output. An input that
+    yielded no lines needs no output file.
+    """
+    if entry is None or entry.get("cleaner_version") != cleaner_version or "lines" not in entry:
+        return False
+    if entry["lines"] and not output_path.exists():
+        return False
+    if entry["size"] == stat.st_size and entry["mtime_ns"] == stat.st_mtime_ns:
+        return True
+    # touched but possibly identical: fall back to the content hash
+    return entry["size"] == stat.st_size and entry["sha256"] == file_digest(input_path)
+
+
+def _clean_one(task: Callable[[Path, Path], int], cleaner_version: int, input_path: Path, output_path: Path) -> dict:
+    start = time.perf_counter()
+    stat = input_path.stat()
+    lines = task(input_path, output_path)
+    return {
+        "sha256": file_digest(input_path),
+        "size": stat.st_size,
+        "mtime_ns": stat.st_mtime_ns,
+        "cleaner_version": cleaner_version,
+        "lines": lines,
+        "seconds": round(time.perf_counter() - start, 4),
+    }
+
+
+def update_tree(
+    input_root: Path,
+    output_root: Path,
+    input_paths: Iterable[Path],
+    task: Callable[[Path, Path], int],
+    cleaner_version: int,
+    manifest_path: Path,
+    workers: int | None = None,
+    force: bool = False,
+    chunksize: int = 1,
+    mp_context=None,
+    report: Callable[[str, dict], None] | None = None,
+) -> tuple[list[str], dict[str, dict]]:
+    """
+    Run `task(input_path, output_path)`, which returns the number of lines written, in a process
+    pool for every input that is new or changed since the manifest at manifest_path was saved,
+    mirroring input_root under output_root. Outputs of inputs that disappeared are deleted and
+    `report(key, entry)` is called as each task finishes. `mp_context` picks how the pool's workers
+    are started, as for ProcessPoolExecutor. Returns the cleaned keys and the new
+    manifest, which is also saved.
+    """
+    manifest = {} if force else load_manifest(manifest_path)
+    todo: list[tuple[str, Path, Path]] = []
+    current: dict[str, dict] = {}
+    for input_path in input_paths:
+        key = input_path.relative_to(input_root).as_posix()
+        output_path = output_root / key
+        entry = manifest.get(key)
+        stat = input_path.stat()
+        if is_unchanged(entry, stat, input_path, output_path, cleaner_version):
+            current[key] = {**entry, "mtime_ns": stat.st_mtime_ns}
+        else:
+            todo.append((key, input_path, output_path))
+
+    for key in manifest:
+        if key not in current and not (input_root / key).exists():
+            (output_root / key).unlink(missing_ok=True)
+
+    if todo:
+        with ProcessPoolExecutor(max_workers=workers, mp_context=mp_context) as pool:
+            entries = pool.map(
+                partial(_clean_one, task, cleaner_version),
+                [input_path for _, input_path, _ in todo],
+                [output_path for _, _, output_path in todo],
+                chunksize=chunksize,
+            )
+            for (key, _, _), entry in zip(todo, entries):
+                current[key] = entry
+                if report is not None:
+                    report(key, entry)
+
+    save_manifest(manifest_path, current)
+    return [key for key, _, _ in todo], current
+
+
+def golden_mismatches(texts: Iterable[str], fast: Callable[[str], str], reference: Callable[[str], str]) -> list[str]:
+    """Golden check: the texts on which a fast rewrite of a cleaning function disagrees with its reference."""
+    return [text for text in texts if fast(text) != reference(text)]
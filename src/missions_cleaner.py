@@ -1,6 +1,16 @@
 import argparse
+import codecs
+import io
 import re
+import sys
 from pathlib import Path
+from typing import Iterable, Iterator
+
+import incremental
+
+MANIFEST_PATH = incremental.STATE_DIR / "clean_missions_manifest.json"
+# Bump whenever a change to extract_dialogue/clean_text alters its output, so every file is re-cleaned.
+CLEANER_VERSION = 3
 
 TIMESTAMP_RE = re.compile(r"^\s*\[-?\d{2}:\d{2}:\d{2}:\d{2}\]\s*$")
 META_RE = re.compile(r"^\s*_[A-Za-z0-9-]+\s*:")
@@ -9,12 +19,40 @@ SPEAKER_RE = re.compile(
 )
 GLOSSARY_RE = re.compile(r"\[glossary:([^\]|]+)(?:\|[^\]]*)?\]")
 BRACKET_TERM_RE = re.compile(r"\[[A-Za-z0-9_-]+:([^\]|]+)(?:\|[^\]]*)?\]")
-TAG_RE = re.compile(r"<(?!/?(?:sub|sup)\b)/?[^>]+>", flags=re.IGNORECASE)
+TAG_RE = re.compile(r"</?[^>]+>")
 SPACE_RE = re.compile(r"\s+")
+# one alternation for every markup kind: bracket terms (glossary included) keep their stripped term as
+# group 1, tags have no group and so are replaced by nothing
+MARKUP_RE = re.compile(r"\[[A-Za-z0-9_-]+:(?=[^\]|])\s*([^\]|]*?)\s*(?:\|[^\]]*)?\]|</?[^>]+>")
+
+SNIFF_BYTES = 64 * 1024
+BOMS = (
+    (codecs.BOM_UTF8, "utf-8-sig"),
+    (codecs.BOM_UTF16_LE, "utf-16"),
+    (codecs.BOM_UTF16_BE, "utf-16"),
+)
+# share of letter bytes that must be in cp1251's Cyrillic block (0xC0-0xFF) to call a sample Russian
+CYRILLIC_MIN_SHARE = 0.3
+CYRILLIC_BYTES = bytes(range(0xC0, 0x100))
+ASCII_LETTER_BYTES = bytes(range(0x41, 0x5B)) + bytes(range(0x61, 0x7B))
 
 
 def clean_text(text: str) -> str:
-    """Keep dialogue words only while preserving punctuation."""
+    """
+    Keep dialogue words only while preserving punctuation. Same result as clean_text_multipass on
+    well-formed markup, but all markup is removed in one regex scan with a template replacement and
+    whitespace is collapsed and stripped by one str.split pass. Only tags inside a bracket term,
+    which the scan puts back into the text, need a second pass.
+    """
+    if "[" in text or "<" in text:
+        text = MARKUP_RE.sub(r"\1", text)
+        if "<" in text:
+            text = TAG_RE.sub("", text)
+    return " ".join(text.split())
+
+
+def clean_text_multipass(text: str) -> str:
+    """Reference implementation of clean_text: one regex pass per kind of markup."""
     text = GLOSSARY_RE.sub(lambda m: m.group(1).strip(), text)
     text = BRACKET_TERM_RE.sub(lambda m: m.group(1).strip(), text)
     text = TAG_RE.sub("", text)
@@ -22,36 +60,36 @@ def clean_text(text: str) -> str:
     return text.strip()
 
 
-def extract_dialogue(raw_text: str) -> list[str]:
-    utterances: list[str] = []
+def extract_dialogue(lines: Iterable[str]) -> Iterator[str]:
+    """Yield utterances from transcript lines as they are read."""
     current_parts: list[str] = []
 
-    for raw_line in raw_text.splitlines():
+    for raw_line in lines:
         line = raw_line.rstrip("\r\n")
         stripped = line.strip()
 
         if not stripped:
             if current_parts:
-                utterances.append(" ".join(current_parts))
+                yield " ".join(current_parts)
                 current_parts = []
             continue
 
         if TIMESTAMP_RE.match(stripped):
             if current_parts:
-                utterances.append(" ".join(current_parts))
+                yield " ".join(current_parts)
                 current_parts = []
             continue
 
         if META_RE.match(stripped):
             if current_parts:
-                utterances.append(" ".join(current_parts))
+                yield " ".join(current_parts)
                 current_parts = []
             continue
 
         speaker_match = SPEAKER_RE.match(line)
         if speaker_match:
             if current_parts:
-                utterances.append(" ".join(current_parts))
+                yield " ".join(current_parts)
                 current_parts = []
 
             spoken = clean_text(speaker_match.group(2))
@@ -66,44 +104,144 @@ def extract_dialogue(raw_text: str) -> list[str]:
                 current_parts.append(continuation)
 
     if current_parts:
-        utterances.append(" ".join(current_parts))
+        yield " ".join(current_parts)
 
-    return utterances
 
+def sniff_encoding(sample: bytes) -> str:
+    """
+    Guess a transcript's encoding from its first bytes: a BOM if there is one, else UTF-8 if the
+    sample decodes as UTF-8 (a sequence cut off at the end of the sample is fine), else cp1251 when
+    Cyrillic letters dominate, else latin-1.
+    """
+    for bom, encoding in BOMS:
+        if sample.startswith(bom):
+            return encoding
+    try:
+        codecs.getincrementaldecoder("utf-8")().decode(sample, final=False)
+        return "utf-8"
+    except UnicodeDecodeError:
+        pass
+    return legacy_encoding([sample])
 
-def read_text_with_fallback(path: Path) -> str:
-    for encoding in ("utf-8", "utf-8-sig", "cp1251", "latin-1"):
-        try:
-            return path.read_text(encoding=encoding)
-        except UnicodeDecodeError:
-            continue
-    return path.read_text(encoding="utf-8", errors="replace")
+
+def legacy_encoding(chunks: Iterable[bytes]) -> str:
+    """cp1251 when Cyrillic letters dominate the letter bytes of `chunks`, else latin-1."""
+    cyrillic = ascii_letters = 0
+    for chunk in chunks:
+        cyrillic += len(chunk) - len(chunk.translate(None, CYRILLIC_BYTES))
+        ascii_letters += len(chunk) - len(chunk.translate(None, ASCII_LETTER_BYTES))
+    if cyrillic >= CYRILLIC_MIN_SHARE * (cyrillic + ascii_letters):
+        return "cp1251"
+    return "latin-1"
 
 
-def clean_missions(input_dir: Path, output_dir: Path) -> tuple[int, int]:
-    files_written = 0
-    utterance_count = 0
+def iter_text_lines(path: Path) -> Iterator[str]:
+    """
+    Lines of a transcript, decoded incrementally in the encoding sniffed from its first
+    SNIFF_BYTES bytes. A file sniffed as UTF-8 that stops being valid UTF-8 further in is decoded
+    from that line on in the encoding legacy_encoding picks for the rest of it, with a warning.
+    """
+    with path.open("rb") as raw:
+        encoding = sniff_encoding(raw.read(SNIFF_BYTES))
+        raw.seek(0)
+        if encoding == "utf-8":
+            offset = 0
+            for chunk in raw:
+                try:
+                    text = chunk.decode("utf-8")
+                except UnicodeDecodeError:
+                    break
+                # split on the same boundaries as str.splitlines, not only on newlines
+                yield from text.splitlines()
+                offset += len(chunk)
+            else:
+                return
+            # judge by the bytes that are not UTF-8, not by the (mostly ASCII) prefix that was
+            raw.seek(offset)
+            encoding = legacy_encoding(iter(lambda: raw.read(1 << 20), b""))
+            print(f"  ! {path}: not UTF-8 after byte {offset}, decoding the rest as {encoding}", file=sys.stderr)
+            raw.seek(offset)
+        with io.TextIOWrapper(raw, encoding=encoding, errors="replace") as text:
+            for line in text:
+                yield from line.splitlines()
 
+
+def iter_transcripts(input_dir: Path) -> Iterator[Path]:
     for src_path in sorted(input_dir.rglob("*")):
-        if not src_path.is_file():
-            continue
-        if "transcripts" not in src_path.parts:
-            continue
+        if src_path.is_file() and "transcripts" in src_path.parts:
+            yield src_path
+
+
+def iter_transcript_utterances(src_path: Path, dst_path: Path | None = None) -> Iterator[str]:
+    """Yield the dialogue of one transcript, also writing it to dst_path when given."""
+    if dst_path is None:
+        yield from extract_dialogue(iter_text_lines(src_path))
+        return
+    dst_path.parent.mkdir(parents=True, exist_ok=True)
+    with dst_path.open("w", encoding="utf-8") as outfile:
+        for utterance in extract_dialogue(iter_text_lines(src_path)):
+            outfile.write(utterance + "\n")
+            yield utterance
+
+
+def clean_transcript(src_path: Path, dst_path: Path) -> int:
+    """Write the dialogue of one transcript to dst_path; returns the number of utterances."""
+    return sum(1 for _ in iter_transcript_utterances(src_path, dst_path))
 
-        raw_text = read_text_with_fallback(src_path)
-        utterances = extract_dialogue(raw_text)
 
-        dst_path = output_dir / src_path.relative_to(input_dir)
-        dst_path.parent.mkdir(parents=True, exist_ok=True)
-        output_text = "\n".join(utterances)
-        if output_text:
-            output_text += "\n"
-        dst_path.write_text(output_text, encoding="utf-8")
+def iter_mission_utterances(input_dir: Path, output_dir: Path | None = None) -> Iterator[str]:
+    """
+    Yield the dialogue of every transcript under input_dir, in the order build_training_dataset
+    reads the cleaned files; with output_dir the cleaned files are written as well.
+    """
+    for src_path in iter_transcripts(input_dir):
+        dst_path = None if output_dir is None else output_dir / src_path.relative_to(input_dir)
+        yield from iter_transcript_utterances(src_path, dst_path)
 
-        files_written += 1
-        utterance_count += len(utterances)
 
-    return files_written, utterance_count
+def clean_missions(
+    input_dir: Path,
+    output_dir: Path,
+    manifest_path: Path = MANIFEST_PATH,
+    workers: int | None = None,
+    force: bool = False,
+    mp_context=None,
+) -> tuple[int, int, int]:
+    """
+    Clean every new or changed transcript under input_dir in a process pool, one task per file,
+    printing how long each took. Returns (files cleaned, files skipped, total utterances).
+    """
+    cleaned, current = incremental.update_tree(
+        input_dir,
+        output_dir,
+        iter_transcripts(input_dir),
+        clean_transcript,
+        CLEANER_VERSION,
+        manifest_path,
+        workers,
+        force,
+        mp_context=mp_context,
+        report=lambda key, entry: print(f"  {key}: {entry['lines']} dialogue lines in {entry['seconds']:.3f}s"),
+    )
+    utterance_count = sum(entry["lines"] for entry in current.values())
+    return len(cleaned), len(current) - len(cleaned), utterance_count
+
+
+def check_clean_text(input_dir: Path) -> list[str]:
+    """
+    Golden check: run clean_text and clean_text_multipass on every string the cleaner can clean
+    under input_dir and return the inputs where they differ.
+    """
+    return incremental.golden_mismatches(_clean_text_inputs(input_dir), clean_text, clean_text_multipass)
+
+
+def _clean_text_inputs(input_dir: Path) -> Iterator[str]:
+    for src_path in iter_transcripts(input_dir):
+        for line in iter_text_lines(src_path):
+            yield line.strip()
+            speaker_match = SPEAKER_RE.match(line)
+            if speaker_match:
+                yield speaker_match.group(2)
 
 
 def parse_args() -> argparse.Namespace:
@@ -126,6 +264,28 @@ def parse_args() -> argparse.Namespace:
         default=Path("data/missions-clean"),
         help="Output root for cleaned transcripts (default: data/missions-clean)",
     )
+    parser.add_argument(
+        "--manifest",
+        type=Path,
+        default=MANIFEST_PATH,
+        help=f"Manifest of cleaned transcripts (default: {MANIFEST_PATH})",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=None,
+        help="Worker processes (default: CPU count)",
+    )
+    parser.add_argument(
+        "--force",
+        action="store_true",
+        help="Re-clean every transcript, ignoring the manifest",
+    )
+    parser.add_argument(
+        "--check-clean-text",
+        action="store_true",
+        help="Compare clean_text with the multi-pass reference on the whole input corpus and exit",
+    )
     return parser.parse_args()
 
 
@@ -134,9 +294,18 @@ def main() -> None:
 
     if not args.input_dir.exists():
         raise SystemExit(f"Input directory not found: {args.input_dir}")
+    if args.check_clean_text:
+        mismatches = check_clean_text(args.input_dir)
+        for text in mismatches[:20]:
+            print(f"MISMATCH: {text!r}")
+        print(f"{len(mismatches)} clean_text mismatches under {args.input_dir}")
+        raise SystemExit(1 if mismatches else 0)
 
-    files_written, utterance_count = clean_missions(args.input_dir, args.output_dir)
+    files_written, files_skipped, utterance_count = clean_missions(
+        args.input_dir, args.output_dir, args.manifest, args.workers, args.force
+    )
     print(f"Wrote {files_written} cleaned transcript files to {args.output_dir}")
+    print(f"Skipped {files_skipped} unchanged transcript files")
     print(f"Extracted {utterance_count} dialogue lines")
 
 
@@ -1,84 +1,617 @@
 #!/usr/bin/env python
+import json
+import multiprocessing
 import os
-import string
-import random
+import socket
+import socketserver
+import stat
+import struct
+import sys
+from collections import deque
+from itertools import islice
 from argparse import ArgumentParser, ArgumentDefaultsHelpFormatter
 
+import numpy as np
 
-class MyModel:
+
+# Contexts are hashed with a polynomial over (code point + 1), nearest character first, then
+# finalized with a 64-bit mixer. The low NEXT_BITS bits of a finalized key are cleared so that a
+# (context, next character id) pair packs into a single uint64 during counting.
+HASH_PRIME = 0x100000001B3
+ORDER_SALT = 0x9E3779B97F4A7C15
+MIX_MUL1 = 0xFF51AFD7ED558CCD
+MIX_MUL2 = 0xC4CEB9FE1A85EC53
+MASK64 = (1 << 64) - 1
+NEXT_BITS = 16
+CONTEXT_MASK = MASK64 ^ ((1 << NEXT_BITS) - 1)
+BOL = '\n'  # every context is read as if preceded by a line break
+
+# Contexts are routed to a per-script sub-model by the last letter among their trailing ROUTE_WINDOW
+# characters. Han characters alongside any kana are treated as Japanese. Scripts with dense
+# vocabularies get short contexts; all others use the model's max_order.
+SCRIPTS = ('common', 'latin', 'cyrillic', 'arabic', 'devanagari', 'han', 'kana', 'hangul')
+SCRIPT_RANGES = [  # (first code point, last code point, script)
+    (0x0041, 0x005A, 'latin'), (0x0061, 0x007A, 'latin'), (0x00C0, 0x024F, 'latin'), (0x1E00, 0x1EFF, 'latin'),
+    (0x0400, 0x052F, 'cyrillic'),
+    (0x0600, 0x06FF, 'arabic'), (0x0750, 0x077F, 'arabic'), (0x08A0, 0x08FF, 'arabic'),
+    (0xFB50, 0xFDFF, 'arabic'), (0xFE70, 0xFEFF, 'arabic'),
+    (0x0900, 0x097F, 'devanagari'),
+    (0x1100, 0x11FF, 'hangul'), (0x3130, 0x318F, 'hangul'), (0xAC00, 0xD7AF, 'hangul'),
+    (0x3040, 0x30FF, 'kana'), (0x31F0, 0x31FF, 'kana'), (0xFF66, 0xFF9F, 'kana'),
+    (0x3400, 0x4DBF, 'han'), (0x4E00, 0x9FFF, 'han'), (0xF900, 0xFAFF, 'han'),
+]
+SHORT_CONTEXT_ORDERS = {'han': 3, 'kana': 3, 'hangul': 4}
+ROUTE_WINDOW = 8
+
+# Checkpoint layout: magic, little-endian uint32 version and header length, a JSON header naming
+# each array's dtype, shape and byte offset, then the raw arrays, each aligned to ARRAY_ALIGN bytes.
+CHECKPOINT_NAME = 'model.checkpoint'
+CHECKPOINT_MAGIC = b'CHRNGRAM'
+CHECKPOINT_VERSION = 3
+ARRAY_ALIGN = 64
+
+
+def finalize_keys(raw, orders):
+    """Turn raw polynomial context hashes into table keys (uint64 arrays, wrapping arithmetic)."""
+    h = np.asarray(raw, dtype=np.uint64) + np.asarray(orders, dtype=np.uint64) * np.uint64(ORDER_SALT)
+    h ^= h >> np.uint64(33)
+    h *= np.uint64(MIX_MUL1)
+    h ^= h >> np.uint64(33)
+    h *= np.uint64(MIX_MUL2)
+    h ^= h >> np.uint64(33)
+    return h & np.uint64(CONTEXT_MASK)
+
+
+def context_raws(context, max_order):
+    """Raw hashes of the order 0..k contexts ending `context` (read after a line break), shortest first."""
+    tail = (BOL + context[-max_order:])[-max_order:].lower()[-max_order:]
+    raws = [0]
+    h, scale = 0, 1
+    for ch in reversed(tail):
+        h = (h + (ord(ch) + 1) * scale) & MASK64
+        scale = (scale * HASH_PRIME) & MASK64
+        raws.append(h)
+    return raws
+
+
+def extend_raws(raws, appended, max_order):
+    """Raw context hashes after `appended` (already lowercased) is typed after the context of `raws`."""
+    for ch in appended:
+        code = ord(ch) + 1
+        raws = [0] + [(code + r * HASH_PRIME) & MASK64 for r in raws[:max_order]]
+    return raws
+
+
+def _align(n):
+    return -(-n // ARRAY_ALIGN) * ARRAY_ALIGN
+
+
+def write_checkpoint(path, arrays, params):
+    """Write named numpy arrays and JSON-serializable params in the flat checkpoint layout."""
+    arrays = {name: np.ascontiguousarray(a) for name, a in arrays.items()}
+    specs = {}
+    offset = 0  # relative to the start of the array section
+    for name, a in arrays.items():
+        specs[name] = {'dtype': a.dtype.str, 'shape': list(a.shape), 'offset': offset}
+        offset = _align(offset + a.nbytes)
+    header = json.dumps({'params': params, 'arrays': specs}).encode('utf-8')
+    data_start = _align(len(CHECKPOINT_MAGIC) + 8 + len(header))
+    with open(path, 'wb') as f:
+        f.write(CHECKPOINT_MAGIC)
+        f.write(struct.pack('<II', CHECKPOINT_VERSION, len(header)))
+        f.write(header)
+        for name, a in arrays.items():
+            f.seek(data_start + specs[name]['offset'])
+            f.write(a.tobytes())
+        f.truncate(data_start + offset)
+
+
+def read_checkpoint(path):
+    """Map a checkpoint written by `write_checkpoint`; arrays are read-only views of one np.memmap."""
+    with open(path, 'rb') as f:
+        magic = f.read(len(CHECKPOINT_MAGIC))
+        if magic != CHECKPOINT_MAGIC:
+            raise ValueError('{} is not a model checkpoint'.format(path))
+        version, header_len = struct.unpack('<II', f.read(8))
+        if version != CHECKPOINT_VERSION:
+            raise ValueError('Checkpoint {} has version {}, expected {}'.format(path, version, CHECKPOINT_VERSION))
+        header = json.loads(f.read(header_len).decode('utf-8'))
+    data_start = _align(len(CHECKPOINT_MAGIC) + 8 + header_len)
+    # plain ndarray views keep the mapping alive without memmap's per-slice subclass overhead
+    buf = np.memmap(path, dtype=np.uint8, mode='r').view(np.ndarray)
+    arrays = {}
+    for name, spec in header['arrays'].items():
+        dtype = np.dtype(spec['dtype'])
+        count = int(np.prod(spec['shape'], dtype=np.int64))
+        start = data_start + spec['offset']
+        arrays[name] = buf[start:start + count * dtype.itemsize].view(dtype).reshape(spec['shape'])
+    return header['params'], arrays
+
+
+def iter_chunks(iterable, size):
+    """Successive lists of up to `size` items from `iterable`."""
+    it = iter(iterable)
+    while True:
+        chunk = list(islice(it, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def iter_shards(lines, size):
+    """
+    Contiguous lists of at least `size` lines (except the last). A shard is only cut where a line does
+    not extend the one before it, so a run of growing prefixes of one utterance always stays together.
+    """
+    shard = []
+    for line in lines:
+        if len(shard) >= size and not line.startswith(shard[-1]):
+            yield shard
+            shard = []
+        shard.append(line)
+    if shard:
+        yield shard
+
+
+def iter_request_batches(read, max_batch):
     """
-    This is a starter model to get you started. Feel free to modify this file.
+    Micro-batches of newline-terminated requests. `read()` blocks until some bytes arrive and returns
+    b'' at end of input; every complete line received by one read is answered together.
     """
+    pending = b''
+    while True:
+        data = read()
+        if not data:
+            break
+        lines = (pending + data).split(b'\n')
+        pending = lines.pop()
+        for i in range(0, len(lines), max_batch):
+            yield [line.decode('utf-8', errors='replace') for line in lines[i:i + max_batch]]
+    if pending:
+        yield [pending.decode('utf-8', errors='replace')]
+
+
+def encode_text(text):
+    """Code points of `text` as a uint32 array."""
+    return np.frombuffer(text.encode('utf-32-le'), dtype=np.uint32)
+
+
+_range_order = sorted(SCRIPT_RANGES)
+_RANGE_FIRST = np.array([r[0] for r in _range_order], dtype=np.int64)
+_RANGE_LAST = np.array([r[1] for r in _range_order], dtype=np.int64)
+_RANGE_SCRIPT = np.array([SCRIPTS.index(r[2]) for r in _range_order], dtype=np.int64)
+
+
+def detect_scripts(contexts, window=ROUTE_WINDOW):
+    """Index into SCRIPTS of each context's routing script, from its last `window` characters."""
+    if not contexts:
+        return np.zeros(0, dtype=np.int64)
+    codes = encode_text(''.join(c[-window:].rjust(window, '\0') for c in contexts)).reshape(len(contexts), window)
+    codes = codes.astype(np.int64)
+    idx = np.searchsorted(_RANGE_FIRST, codes, side='right') - 1
+    in_range = (idx >= 0) & (codes <= _RANGE_LAST[np.maximum(idx, 0)])
+    scripts = np.where(in_range, _RANGE_SCRIPT[np.maximum(idx, 0)], 0)
+    lettered = scripts > 0
+    last = window - 1 - np.argmax(lettered[:, ::-1], axis=1)
+    routes = np.where(lettered.any(axis=1), scripts[np.arange(len(contexts)), last], 0)
+    japanese = (routes == SCRIPTS.index('han')) & (scripts == SCRIPTS.index('kana')).any(axis=1)
+    routes[japanese] = SCRIPTS.index('kana')
+    return routes
+
+
+def table_checkpoint_name(script):
+    return 'model.{}.checkpoint'.format(script)
+
+
+class CharNgramTable:
+    """
+    Character n-gram model reduced to its top-3 answers, stored as flat sorted arrays.
+
+    `keys` holds one hashed context per row (all orders mixed together, sorted ascending), and
+    `answers[i]` is the final three-character prediction for context `i`, already filled in from
+    shorter contexts. Contexts whose answer equals that of their one-shorter suffix are dropped,
+    so the longest context found at query time always carries the right answer.
+    """
+
+    def __init__(self, keys, answers, max_order):
+        self.keys = keys
+        self.answers = answers
+        self.max_order = max_order
 
     @classmethod
-    def load_training_data(cls):
-        # your code here
-        # this particular model doesn't train
-        return []
+    def build(cls, lines, max_order, min_count, k=3):
+        text = BOL + BOL.join(line.lower() for line in lines)
+        codes = encode_text(text)
+        n = len(codes)
+        positions = np.arange(n)
+        is_bol = codes == ord(BOL)
+        # number of characters (including the line break) available as context at each position
+        avail = positions - np.maximum.accumulate(np.where(is_bol, positions, 0))
+        targets = np.flatnonzero(~is_bol)
+        vocab, target_ids = np.unique(codes[targets], return_inverse=True)
+        if len(vocab) > (1 << NEXT_BITS):
+            raise ValueError('Vocabulary of {} characters does not fit in {} bits'.format(len(vocab), NEXT_BITS))
+        target_ids = target_ids.astype(np.uint64)
+
+        out_keys, out_answers = [], []
+        prev_keys = prev_answers = None
+        raw = np.zeros(n, dtype=np.uint64)
+        shifted = codes[:-1].astype(np.uint64) + np.uint64(1)
+        for order in range(max_order + 1):
+            parent_raw = raw
+            if order > 0:
+                raw = np.zeros(n, dtype=np.uint64)
+                raw[1:] = shifted + parent_raw[:-1] * np.uint64(HASH_PRIME)
+            valid = avail[targets] >= order
+            if not valid.any():
+                break
+            pos = targets[valid]
+            pairs, first, pair_counts = np.unique(finalize_keys(raw[pos], order) | target_ids[valid],
+                                                  return_index=True, return_counts=True)
+
+            contexts = pairs & np.uint64(CONTEXT_MASK)
+            starts = np.flatnonzero(np.r_[True, contexts[1:] != contexts[:-1]])
+            group = np.cumsum(np.r_[False, contexts[1:] != contexts[:-1]])
+            keep = np.add.reduceat(pair_counts, starts) >= min_count
+            if order == 0:
+                keep[:] = True  # the empty context is the final backoff
+
+            # own top-k next characters, most frequent first (ties to the lower code point)
+            ranked = np.lexsort((-pair_counts.astype(np.int64), group))
+            rank = np.arange(len(pairs)) - starts[group[ranked]]
+            top = ranked[rank < k]
+            own = np.full((len(starts), k), -1, dtype=np.int64)
+            own[group[top], rank[rank < k]] = vocab[(pairs[top] & np.uint64((1 << NEXT_BITS) - 1)).astype(np.int64)]
+
+            if prev_keys is None:
+                candidates = own
+                parent_answers = np.full_like(own, -1)
+            else:
+                parent_keys = finalize_keys(parent_raw[pos[first[starts]]], order - 1)
+                rows = np.minimum(np.searchsorted(prev_keys, parent_keys), len(prev_keys) - 1)
+                parent_answers = np.where((prev_keys[rows] == parent_keys)[:, None], prev_answers[rows], -1)
+                candidates = np.concatenate([own, parent_answers], axis=1)
+            # keep the first k distinct characters of own guesses followed by the parent's answer
+            dup = np.zeros(candidates.shape, dtype=bool)
+            for j in range(1, candidates.shape[1]):
+                dup[:, j] = (candidates[:, :j] == candidates[:, j:j + 1]).any(axis=1)
+            pick = np.argsort(dup | (candidates < 0), axis=1, kind='stable')[:, :k]
+            answers = np.take_along_axis(np.where(dup, -1, candidates), pick, axis=1)
+
+            prev_keys, prev_answers = contexts[starts][keep], answers[keep]
+            novel = keep & ((answers != parent_answers).any(axis=1) | (order == 0))
+            out_keys.append(contexts[starts][novel])
+            out_answers.append(answers[novel])
+        del raw, parent_raw, shifted
+
+        keys = np.concatenate(out_keys)
+        answers = np.concatenate(out_answers)
+        order_idx = np.argsort(keys)
+        answers = np.maximum(answers[order_idx], 0).astype(np.uint32)
+        return cls(keys[order_idx], answers.view('<U{}'.format(k)).reshape(len(keys)), max_order)
+
+    def lookup(self, keys):
+        """Row index of each key in `self.keys`, or -1 when absent."""
+        idx = np.searchsorted(self.keys, keys)
+        idx[idx == len(self.keys)] = 0
+        return np.where(self.keys[idx] == keys, idx, -1)
+
+    def top_chars(self, raws):
+        """The precomputed answer of the longest known context."""
+        rows = self.lookup(finalize_keys(raws, np.arange(len(raws))))
+        return str(self.answers[rows[rows >= 0][-1]])
+
+    def batch_top_chars(self, contexts):
+        """`top_chars` for many contexts at once: one hashing pass and one search over the table."""
+        if not contexts:
+            return []
+        order = self.max_order
+        tails = [(BOL + c[-order:])[-order:].lower()[-order:] for c in contexts]
+        lengths = np.fromiter(map(len, tails), dtype=np.int64, count=len(tails))
+        codes = encode_text(''.join(t.rjust(order, '\0') for t in tails)).reshape(len(tails), order)
+        codes = codes.astype(np.uint64) + np.uint64(1)
+
+        # raws[:, j] hashes the last j characters, nearest first (see context_raws)
+        raws = np.zeros((len(tails), order + 1), dtype=np.uint64)
+        scale = 1
+        for j in range(1, order + 1):
+            raws[:, j] = raws[:, j - 1] + codes[:, order - j] * np.uint64(scale)
+            scale = (scale * HASH_PRIME) & MASK64
+        keys = finalize_keys(raws, np.arange(order + 1))
+
+        idx = np.searchsorted(self.keys, keys.ravel()).reshape(keys.shape)
+        idx[idx == len(self.keys)] = 0
+        found = (self.keys[idx] == keys) & (np.arange(order + 1) <= lengths[:, None])
+        longest = order - np.argmax(found[:, ::-1], axis=1)
+        return self.answers[idx[np.arange(len(tails)), longest]].tolist()
+
+
+class PrefixState:
+    """
+    Context hashes carried from one input line to the next.
+
+    Test files hold runs of lines that are growing prefixes of one utterance. When a line extends
+    the previous one only the appended characters are hashed, and an identical line reuses the
+    previous prediction outright.
+    """
+
+    def __init__(self, max_order):
+        self.max_order = max_order
+        self.prev = None
+        self.raws = None
+        self.pred = None
+        self.hits = 0
+        self.misses = 0
+
+    def advance(self, inp):
+        """Move to `inp`; returns True when the previous prediction still applies."""
+        prev = self.prev
+        self.prev = inp
+        if prev is not None and inp.startswith(prev):
+            self.hits += 1
+            appended = inp[len(prev):]
+            if not appended:
+                return True
+            if len(appended) < self.max_order:
+                self.raws = extend_raws(self.raws, appended.lower(), self.max_order)
+                return False
+        else:
+            self.misses += 1
+        self.raws = context_raws(inp, self.max_order)
+        return False
+
+
+class MyModel:
+    """
+    Character n-gram model: predicts the next character from the longest previously seen context,
+    backing off to shorter ones until three guesses are found.
+
+    Each context is routed by script (see detect_scripts) to its own CharNgramTable. Sub-models are
+    memory-mapped on first use, so a test file in one script never touches the others' pages.
+    """
+
+    def __init__(self, max_order=8, min_count=2, min_route_lines=1000):
+        self.max_order = max_order
+        self.min_count = min_count
+        self.min_route_lines = min_route_lines
+        self.route_orders = {}  # script -> context length of its sub-model
+        self.fallback = None  # script whose sub-model answers contexts without one of their own
+        self.tables = {}  # sub-models trained or mapped so far
+        self.work_dir = None  # checkpoint directory this model was loaded from
+        self.prefix_state = PrefixState(max_order)
+
+    @property
+    def prefix_hits(self):
+        return self.prefix_state.hits
+
+    @property
+    def prefix_misses(self):
+        return self.prefix_state.misses
+
+    def table(self, script):
+        """The sub-model answering contexts routed to `script`, mapped from the checkpoint on first use."""
+        if script not in self.route_orders:
+            script = self.fallback
+        table = self.tables.get(script)
+        if table is None:
+            _, arrays = read_checkpoint(os.path.join(self.work_dir, table_checkpoint_name(script)))
+            table = CharNgramTable(arrays['keys'], arrays['answers'], self.route_orders[script])
+            self.tables[script] = table
+        return table
 
     @classmethod
-    def load_test_data(cls, fname):
-        # your code here
+    def load_training_data(cls, fname='data/training_dataset.txt'):
         data = []
-        with open(fname) as f:
+        with open(fname, encoding='utf-8') as f:
             for line in f:
-                inp = line[:-1]  # the last character is a newline
-                data.append(inp)
+                line = line.rstrip('\n')
+                if line:
+                    data.append(line)
         return data
 
+    @classmethod
+    def iter_test_data(cls, fname):
+        with open(fname, encoding='utf-8') as f:
+            for line in f:
+                yield line[:-1] if line.endswith('\n') else line  # drop the trailing newline
+
+    @classmethod
+    def load_test_data(cls, fname):
+        return list(cls.iter_test_data(fname))
+
     @classmethod
     def write_pred(cls, preds, fname):
-        with open(fname, 'wt') as f:
-            for p in preds:
-                f.write('{}\n'.format(p))
+        with open(fname, 'wt', encoding='utf-8') as f:
+            f.writelines(p + '\n' for p in preds)
+
+    def stream_pred(self, fin, fout, chunk_size, incremental=False, workers=1):
+        """
+        Predict `fin` in chunks of `chunk_size` lines, writing each chunk to `fout` as soon as it is done,
+        so memory stays bounded whatever the size of the input. Returns the number of lines predicted.
+        """
+        lines = self.iter_test_data(fin)
+        if workers > 1:
+            batches = self.run_pred_sharded(iter_shards(lines, chunk_size), workers, incremental=incremental)
+        else:
+            batches = ((chunk, self.run_pred(chunk, incremental=incremental))
+                       for chunk in iter_chunks(lines, chunk_size))
+        n_inputs = n_preds = 0
+        with open(fout, 'wt', encoding='utf-8') as f:
+            for chunk, preds in batches:
+                n_inputs += len(chunk)
+                n_preds += len(preds)
+                assert n_preds == n_inputs, 'Expected {} predictions but got {}'.format(n_inputs, n_preds)
+                f.write('\n'.join(preds) + '\n')
+        return n_preds
 
     def run_train(self, data, work_dir):
-        # your code here
-        pass
-
-    def run_pred(self, data):
-        # your code here
-        preds = []
-        all_chars = string.ascii_letters
-        for inp in data:
-            # this model just predicts a random character each time
-            top_guesses = [random.choice(all_chars) for _ in range(3)]
-            preds.append(''.join(top_guesses))
-        return preds
+        by_script = {}
+        for line, route in zip(data, detect_scripts(data)):
+            by_script.setdefault(SCRIPTS[route], []).append(line)
+        self.fallback = max(by_script, key=lambda script: len(by_script[script]))
+        for script in list(by_script):
+            if script != self.fallback and (script == 'common' or len(by_script[script]) < self.min_route_lines):
+                by_script[self.fallback].extend(by_script.pop(script))
+        for script, lines in by_script.items():
+            order = min(self.max_order, SHORT_CONTEXT_ORDERS.get(script, self.max_order))
+            print('Training {} model on {} lines'.format(script, len(lines)))
+            self.route_orders[script] = order
+            self.tables[script] = CharNgramTable.build(lines, order, self.min_count)
+
+    def predict_next(self, inp):
+        state = self.prefix_state
+        if not state.advance(inp):
+            table = self.table(SCRIPTS[detect_scripts([inp])[0]])
+            state.pred = table.top_chars(state.raws[:table.max_order + 1])
+        return state.pred
+
+    def run_pred(self, data, incremental=False):
+        if incremental:
+            return [self.predict_next(inp) for inp in data]
+        routes = detect_scripts(data)
+        preds = np.empty(len(data), dtype=object)
+        for route in np.unique(routes):
+            rows = np.flatnonzero(routes == route)
+            preds[rows] = self.table(SCRIPTS[route]).batch_top_chars([data[i] for i in rows])
+        return preds.tolist()
+
+    def run_pred_sharded(self, shards, workers, incremental=False):
+        """
+        Predict `shards` in a pool of `workers` processes, yielding `(shard, preds)` in input order. Each
+        worker memory-maps this model's checkpoint instead of receiving a pickled copy, and at most two
+        shards per worker are in flight so streaming input stays bounded.
+        """
+        with multiprocessing.Pool(workers, initializer=_init_worker, initargs=(self.work_dir,)) as pool:
+            pending = deque()
+            for shard in shards:
+                pending.append((shard, pool.apply_async(_predict_shard, (shard, incremental))))
+                if len(pending) >= 2 * workers:
+                    yield self._collect_shard(*pending.popleft())
+            while pending:
+                yield self._collect_shard(*pending.popleft())
+
+    def _collect_shard(self, shard, result):
+        preds, hits, misses = result.get()
+        self.prefix_state.hits += hits
+        self.prefix_state.misses += misses
+        return shard, preds
+
+    def serve(self, read, write, max_batch):
+        """
+        Answer each context line from `read()` (see iter_request_batches) with its prediction line, passed
+        to `write` as bytes one micro-batch at a time. Returns the number of requests answered.
+        """
+        n_served = 0
+        for batch in iter_request_batches(read, max_batch):
+            write(('\n'.join(self.run_pred(batch)) + '\n').encode('utf-8'))
+            n_served += len(batch)
+        return n_served
 
     def save(self, work_dir):
-        # your code here
-        # this particular model has nothing to save, but for demonstration purposes we will save a blank file
-        with open(os.path.join(work_dir, 'model.checkpoint'), 'wt') as f:
-            f.write('dummy save')
+        for script, t in self.tables.items():
+            write_checkpoint(os.path.join(work_dir, table_checkpoint_name(script)),
+                             {'keys': t.keys, 'answers': t.answers}, {'script': script, 'max_order': t.max_order})
+        params = {'max_order': self.max_order, 'min_count': self.min_count, 'min_route_lines': self.min_route_lines,
+                  'route_orders': self.route_orders, 'fallback': self.fallback}
+        write_checkpoint(os.path.join(work_dir, CHECKPOINT_NAME), {}, params)
 
     @classmethod
     def load(cls, work_dir):
-        # your code here
-        # this particular model has nothing to load, but for demonstration purposes we will load a blank file
-        with open(os.path.join(work_dir, 'model.checkpoint')) as f:
-            dummy_save = f.read()
-        return MyModel()
+        params, _ = read_checkpoint(os.path.join(work_dir, CHECKPOINT_NAME))
+        model = MyModel(max_order=params['max_order'], min_count=params['min_count'],
+                        min_route_lines=params['min_route_lines'])
+        model.route_orders = params['route_orders']
+        model.fallback = params['fallback']
+        model.work_dir = work_dir
+        return model
+
+
+class PredictionHandler(socketserver.BaseRequestHandler):
+    """One client connection of the Unix socket server, speaking the same line protocol as stdin."""
+
+    def handle(self):
+        self.server.model.serve(lambda: self.request.recv(1 << 16), self.request.sendall, self.server.max_batch)
+
+
+def socket_in_use(path):
+    """Whether a server still accepts connections on the Unix socket at `path`."""
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as probe:
+        try:
+            probe.connect(path)
+        except (ConnectionRefusedError, FileNotFoundError):
+            return False
+    return True
+
+
+def serve_unix_socket(model, path, max_batch):
+    # only a stale socket from an earlier server may be replaced; anything else at `path` is left alone
+    if os.path.lexists(path):
+        if not stat.S_ISSOCK(os.lstat(path).st_mode):
+            raise FileExistsError('{} exists and is not a socket; refusing to replace it'.format(path))
+        if socket_in_use(path):
+            raise FileExistsError('a server is already listening on {}'.format(path))
+        os.unlink(path)
+    with socketserver.ThreadingUnixStreamServer(path, PredictionHandler) as server:
+        server.model = model
+        server.max_batch = max_batch
+        print('Serving predictions on {}'.format(path), file=sys.stderr)
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            os.unlink(path)
+
+
+def write_stdout(data):
+    sys.stdout.buffer.write(data)
+    sys.stdout.buffer.flush()
+
+
+_worker_model = None
+
+
+def _init_worker(work_dir):
+    global _worker_model
+    _worker_model = MyModel.load(work_dir)
+
+
+def _predict_shard(shard, incremental):
+    state = _worker_model.prefix_state
+    hits, misses = state.hits, state.misses
+    preds = _worker_model.run_pred(shard, incremental=incremental)
+    return preds, state.hits - hits, state.misses - misses
 
 
 if __name__ == '__main__':
     parser = ArgumentParser(formatter_class=ArgumentDefaultsHelpFormatter)
-    parser.add_argument('mode', choices=('train', 'test'), help='what to run')
+    parser.add_argument('mode', choices=('train', 'test', 'serve'), help='what to run')
     parser.add_argument('--work_dir', help='where to save', default='work')
+    parser.add_argument('--train_data', help='path to training data', default='data/training_dataset.txt')
     parser.add_argument('--test_data', help='path to test data', default='example/input.txt')
     parser.add_argument('--test_output', help='path to write test predictions', default='pred.txt')
+    parser.add_argument('--incremental', action='store_true',
+                        help='predict line by line, reusing state when a line extends the previous one')
+    parser.add_argument('--stream', action='store_true',
+                        help='read, predict and write the test data in chunks instead of all at once')
+    parser.add_argument('--chunk_size', type=int, help='lines per chunk in --stream mode', default=65536)
+    parser.add_argument('--workers', type=int, help='number of prediction processes', default=1)
+    parser.add_argument('--socket', help='serve on this Unix socket path instead of stdin/stdout')
+    parser.add_argument('--max_batch', type=int, help='most requests answered together in serve mode', default=4096)
+    parser.add_argument('--max_order', type=int, help='longest context in characters', default=8)
+    parser.add_argument('--min_count', type=int, help='drop contexts seen fewer times than this', default=2)
+    parser.add_argument('--min_route_lines', type=int, default=1000,
+                        help='scripts with fewer training lines share the fallback model')
     args = parser.parse_args()
 
-    random.seed(0)
-
     if args.mode == 'train':
         if not os.path.isdir(args.work_dir):
             print('Making working directory {}'.format(args.work_dir))
             os.makedirs(args.work_dir)
         print('Instatiating model')
-        model = MyModel()
+        model = MyModel(max_order=args.max_order, min_count=args.min_count, min_route_lines=args.min_route_lines)
         print('Loading training data')
-        train_data = MyModel.load_training_data()
+        train_data = MyModel.load_training_data(args.train_data)
         print('Training')
         model.run_train(train_data, args.work_dir)
         print('Saving model')
@@ -86,12 +619,34 @@ if __name__ == '__main__':
     elif args.mode == 'test':
         print('Loading model')
         model = MyModel.load(args.work_dir)
-        print('Loading test data from {}'.format(args.test_data))
-        test_data = MyModel.load_test_data(args.test_data)
-        print('Making predictions')
-        pred = model.run_pred(test_data)
-        print('Writing predictions to {}'.format(args.test_output))
-        assert len(pred) == len(test_data), 'Expected {} predictions but got {}'.format(len(test_data), len(pred))
-        model.write_pred(pred, args.test_output)
+        if args.stream:
+            print('Streaming predictions for {} to {}'.format(args.test_data, args.test_output))
+            n_pred = model.stream_pred(args.test_data, args.test_output, args.chunk_size,
+                                       incremental=args.incremental, workers=args.workers)
+            print('Wrote {} predictions'.format(n_pred))
+        else:
+            print('Loading test data from {}'.format(args.test_data))
+            test_data = MyModel.load_test_data(args.test_data)
+            print('Making predictions')
+            if args.workers > 1:
+                shards = iter_shards(test_data, max(1, len(test_data) // (4 * args.workers)))
+                pred = [p for _, preds in model.run_pred_sharded(shards, args.workers, incremental=args.incremental)
+                        for p in preds]
+            else:
+                pred = model.run_pred(test_data, incremental=args.incremental)
+            print('Writing predictions to {}'.format(args.test_output))
+            assert len(pred) == len(test_data), 'Expected {} predictions but got {}'.format(len(test_data), len(pred))
+            model.write_pred(pred, args.test_output)
+        if args.incremental:
+            print('Prefix reuse: {} hits, {} misses'.format(model.prefix_hits, model.prefix_misses))
+    elif args.mode == 'serve':
+        # stdout carries the protocol, so progress goes to stderr
+        print('Loading model', file=sys.stderr)
+        model = MyModel.load(args.work_dir)
+        if args.socket:
+            serve_unix_socket(model, args.socket, args.max_batch)
+        else:
+            n_served = model.serve(lambda: os.read(sys.stdin.fileno(), 1 << 16), write_stdout, args.max_batch)
+            print('Answered {} requests'.format(n_served), file=sys.stderr)
     else:
         raise NotImplementedError('Unknown mode {}'.format(args.mode))
@@ -0,0 +1,335 @@
+import hashlib
+import json
+import multiprocessing
+import threading
+import time
+from argparse import ArgumentParser
+from collections.abc import Callable
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from itertools import chain
+from pathlib import Path
+
+import apollo_jornals_scraper
+import build_training_dataset
+import data_cleaner
+import incremental
+import missions_cleaner
+
+
+STATE_DIR = incremental.STATE_DIR
+STATE_NAME = "state.json"
+URLS_FILE = Path("data/apollo-journals/urls.txt")
+JOURNALS_ROOT = data_cleaner.INPUT_ROOT
+JOURNALS_CLEAN_ROOT = data_cleaner.OUTPUT_ROOT
+MISSIONS_ROOT = Path("data/missions")
+MISSIONS_CLEAN_ROOT = Path("data/missions-clean")
+DATASET_PATH = Path("data/training_dataset.txt")
+# stages run on threads, so their process pools must not fork this (multi-threaded) process
+STAGE_MP_CONTEXT = "forkserver"
+
+
+class FileHasher:
+    """sha256 of files, remembered by (size, mtime) across runs so unchanged files are not re-read."""
+
+    def __init__(self, known: dict[str, list] | None = None) -> None:
+        self.known = {} if known is None else known
+        self.used: set[str] = set()
+        self.lock = threading.Lock()
+
+    def digest(self, path: Path) -> str:
+        stat = path.stat()
+        key = path.as_posix()
+        with self.lock:
+            self.used.add(key)
+            entry = self.known.get(key)
+        if entry is not None and entry[0] == stat.st_size and entry[1] == stat.st_mtime_ns:
+            return entry[2]
+        digest = incremental.file_digest(path)
+        with self.lock:
+            self.known[key] = [stat.st_size, stat.st_mtime_ns, digest]
+        return digest
+
+
+class Stage:
+    """
+    One step of the corpus build. `inputs` and `outputs` are (root, glob) pairs whose matching files
+    are fingerprinted by content; `code` lists the modules whose source is part of the fingerprint.
+    A `volatile` stage depends on something outside the tree, such as a website, and runs every time;
+    its outputs' fingerprints still decide whether the stages after it run.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        run: Callable[[bool], object],
+        inputs: list[tuple[Path, str]],
+        outputs: list[tuple[Path, str]],
+        code: list,
+        after: tuple[str, ...] = (),
+        params: dict | None = None,
+        volatile: bool = False,
+    ) -> None:
+        self.name = name
+        self.run = run
+        self.inputs = inputs
+        self.outputs = outputs
+        self.code = code
+        self.after = after
+        self.params = params or {}
+        self.volatile = volatile
+
+
+def fingerprint_files(patterns: list[tuple[Path, str]], hasher: FileHasher) -> str:
+    digest = hashlib.sha256()
+    for root, pattern in patterns:
+        digest.update(f"{root.as_posix()}\0{pattern}\n".encode("utf-8"))
+        for path in sorted(root.rglob(pattern)) if root.exists() else []:
+            if path.is_file():
+                digest.update(f"{path.relative_to(root).as_posix()}\0{hasher.digest(path)}\n".encode("utf-8"))
+    return digest.hexdigest()
+
+
+def fingerprint_stage(stage: Stage, hasher: FileHasher) -> str:
+    """Hash of the stage's code, parameters and input contents: the stage re-runs when it changes."""
+    digest = hashlib.sha256(stage.name.encode("utf-8"))
+    for module in stage.code:
+        digest.update(hasher.digest(Path(module.__file__)).encode("ascii"))
+    digest.update(json.dumps(stage.params, sort_keys=True, default=str).encode("utf-8"))
+    digest.update(fingerprint_files(stage.inputs, hasher).encode("ascii"))
+    return digest.hexdigest()
+
+
+def load_state(state_path: Path) -> dict:
+    if not state_path.exists():
+        return {"stages": {}, "files": {}}
+    return json.loads(state_path.read_text(encoding="utf-8"))
+
+
+def save_state(state_path: Path, state: dict) -> None:
+    state_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = state_path.with_name(state_path.name + ".tmp")
+    tmp_path.write_text(json.dumps(state, indent=2, sort_keys=True) + "\n", encoding="utf-8")
+    tmp_path.replace(state_path)
+
+
+def run_stage(stage: Stage, recorded: dict | None, hasher: FileHasher, force: bool) -> dict:
+    """
+    Run `stage` unless its fingerprint and outputs still match `recorded`; returns its new record.
+    Outputs changed behind the pipeline's back are rebuilt from scratch, since the cleaners' own
+    manifests only look at their inputs and would keep the edited files.
+    """
+    fingerprint = fingerprint_stage(stage, hasher)
+    outputs_changed = recorded is not None and recorded["outputs"] != fingerprint_files(stage.outputs, hasher)
+    if (
+        not force
+        and not stage.volatile
+        and recorded is not None
+        and recorded["fingerprint"] == fingerprint
+        and not outputs_changed
+    ):
+        return {**recorded, "ran": False}
+    start = time.perf_counter()
+    stage.run(force or outputs_changed)
+    return {
+        "fingerprint": fingerprint,
+        "outputs": fingerprint_files(stage.outputs, hasher),
+        "seconds": round(time.perf_counter() - start, 3),
+        "ran": True,
+    }
+
+
+def run_pipeline(stages: list[Stage], state_path: Path, force: bool = False) -> dict[str, str]:
+    """
+    Run stages in dependency order, each as soon as everything it comes after has finished, so
+    independent stages run concurrently. A stage whose upstream failed is not run. Returns each
+    stage's outcome: "ran", "cached", "failed" or "blocked".
+    """
+    by_name = {stage.name: stage for stage in stages}
+    for stage in stages:
+        unknown = [name for name in stage.after if name not in by_name]
+        if unknown:
+            raise ValueError(f"stage {stage.name} comes after unknown stages: {unknown}")
+
+    state_path.parent.mkdir(parents=True, exist_ok=True)
+    state = load_state(state_path)
+    hasher = FileHasher(state["files"])
+    outcome: dict[str, str] = {}
+    with ThreadPoolExecutor(max_workers=len(stages) or 1) as pool:
+        running = {}
+        while len(outcome) < len(stages):
+            for stage in stages:
+                if stage.name in outcome or stage in running.values():
+                    continue
+                if any(outcome.get(name) in ("failed", "blocked") for name in stage.after):
+                    outcome[stage.name] = "blocked"
+                    print(f"[{stage.name}] blocked by a failed upstream stage")
+                elif all(outcome.get(name) in ("ran", "cached") for name in stage.after):
+                    recorded = state["stages"].get(stage.name)
+                    running[pool.submit(run_stage, stage, recorded, hasher, force)] = stage
+            if not running:
+                if len(outcome) < len(stages):
+                    pending = [stage.name for stage in stages if stage.name not in outcome]
+                    raise ValueError(f"dependency cycle between stages: {pending}")
+                break
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                stage = running.pop(future)
+                try:
+                    record = future.result()
+                except Exception as exc:
+                    outcome[stage.name] = "failed"
+                    print(f"[{stage.name}] failed: {exc!r}")
+                    continue
+                outcome[stage.name] = "ran" if record.pop("ran") else "cached"
+                state["stages"][stage.name] = record
+                save_state(state_path, state)
+                if outcome[stage.name] == "ran":
+                    print(f"[{stage.name}] ran in {record['seconds']:.2f}s")
+                else:
+                    print(f"[{stage.name}] up to date")
+    # forget hashes of files no stage looked at, e.g. deleted ones
+    state["files"] = {key: hasher.known[key] for key in hasher.used if key in hasher.known}
+    save_state(state_path, state)
+    return outcome
+
+
+def corpus_stages(
+    state_dir: Path,
+    scrape: bool = False,
+    urls_file: Path = URLS_FILE,
+    workers: int | None = None,
+    dedup: str = "exact",
+    streaming: bool = False,
+    write_clean: bool = False,
+) -> list[Stage]:
+    """
+    The corpus build: scrape -> clean journals, clean missions -> training dataset. With `streaming`
+    the cleaners and the dataset builder are one stage: utterances go from the cleaners' generators
+    straight into the dedup, and the cleaned files are only written if `write_clean` is set.
+    """
+    mp_context = multiprocessing.get_context(STAGE_MP_CONTEXT)
+    stages = []
+    if scrape:
+        def run_scrape(force: bool) -> None:
+            apollo_jornals_scraper.scrape(
+                main_urls=apollo_jornals_scraper.read_urls(urls_file),
+                output_dir=JOURNALS_ROOT,
+                timeout=20.0,
+                rate=5.0,
+                concurrency=4,
+                max_links_per_main=None,
+                # conditional GETs against the cache keep an unchanged site cheap to re-scrape
+                cache=apollo_jornals_scraper.ResponseCache(JOURNALS_ROOT / "http-cache"),
+                resume=False,
+            )
+
+        stages.append(
+            Stage("scrape", run_scrape, [(urls_file.parent, urls_file.name)], [(JOURNALS_ROOT, "*.txt")],
+                  [apollo_jornals_scraper], volatile=True)
+        )
+
+    if streaming:
+        def run_streaming(force: bool) -> None:
+            texts = chain(
+                data_cleaner.iter_tree_utterances(JOURNALS_ROOT, JOURNALS_CLEAN_ROOT if write_clean else None),
+                missions_cleaner.iter_mission_utterances(MISSIONS_ROOT, MISSIONS_CLEAN_ROOT if write_clean else None),
+            )
+            build_training_dataset.build_dataset_from_texts(texts, DATASET_PATH, dedup=dedup)
+
+        outputs = [(DATASET_PATH.parent, DATASET_PATH.name)]
+        if write_clean:
+            outputs += [(JOURNALS_CLEAN_ROOT, "*.txt"), (MISSIONS_CLEAN_ROOT, "*")]
+        stages.append(
+            Stage(
+                "stream_dataset",
+                run_streaming,
+                [(JOURNALS_ROOT, "*.txt"), (MISSIONS_ROOT, "*/transcripts/*")],
+                outputs,
+                [data_cleaner, missions_cleaner, build_training_dataset],
+                after=("scrape",) if scrape else (),
+                params={"dedup": dedup, "write_clean": write_clean},
+            )
+        )
+        return stages
+
+    stages.append(
+        Stage(
+            "clean_journals",
+            lambda force: data_cleaner.clean_tree(
+                JOURNALS_ROOT, JOURNALS_CLEAN_ROOT, state_dir / data_cleaner.MANIFEST_PATH.name, workers, force,
+                mp_context=mp_context,
+            ),
+            [(JOURNALS_ROOT, "*.txt")],
+            [(JOURNALS_CLEAN_ROOT, "*.txt")],
+            [data_cleaner, incremental],
+            after=("scrape",) if scrape else (),
+        )
+    )
+    stages.append(
+        Stage(
+            "clean_missions",
+            lambda force: missions_cleaner.clean_missions(
+                MISSIONS_ROOT, MISSIONS_CLEAN_ROOT, state_dir / missions_cleaner.MANIFEST_PATH.name, workers, force,
+                mp_context=mp_context,
+            ),
+            [(MISSIONS_ROOT, "*/transcripts/*")],
+            [(MISSIONS_CLEAN_ROOT, "*")],
+            [missions_cleaner, incremental],
+        )
+    )
+    stages.append(
+        Stage(
+            "build_dataset",
+            lambda force: build_training_dataset.build_dataset(
+                [JOURNALS_CLEAN_ROOT, MISSIONS_CLEAN_ROOT], DATASET_PATH, dedup=dedup, workers=workers,
+                mp_context=mp_context,
+            ),
+            [(JOURNALS_CLEAN_ROOT, "*"), (MISSIONS_CLEAN_ROOT, "*")],
+            [(DATASET_PATH.parent, DATASET_PATH.name)],
+            [build_training_dataset],
+            after=("clean_journals", "clean_missions"),
+            params={"dedup": dedup},
+        )
+    )
+    return stages
+
+
+def parse_args():
+    parser = ArgumentParser(
+        description="Build data/training_dataset.txt end to end, re-running only stages whose inputs or code changed."
+    )
+    parser.add_argument("--scrape", action="store_true", help="Also (re)scrape the Apollo journals first.")
+    parser.add_argument("--urls-file", type=Path, default=URLS_FILE, help="Main journal URLs for the scrape stage.")
+    parser.add_argument("--state-dir", type=Path, default=STATE_DIR, help="Where stage fingerprints are kept.")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes per stage (default: CPU count).")
+    parser.add_argument(
+        "--dedup", choices=build_training_dataset.DEDUP_MODES, default="exact", help="Dataset dedup mode."
+    )
+    parser.add_argument(
+        "--streaming",
+        action="store_true",
+        help="Feed the cleaners' utterances straight into the dataset dedup instead of via the *-clean directories.",
+    )
+    parser.add_argument(
+        "--write-clean",
+        action="store_true",
+        help="With --streaming, still write the *-clean directories for debugging.",
+    )
+    parser.add_argument("--force", action="store_true", help="Re-run every stage from scratch.")
+    return parser.parse_args()
+
+
+def main() -> None:
+    args = parse_args()
+    stages = corpus_stages(
+        args.state_dir, args.scrape, args.urls_file, args.workers, args.dedup, args.streaming, args.write_clean
+    )
+    start = time.perf_counter()
+    outcome = run_pipeline(stages, args.state_dir / STATE_NAME, args.force)
+    print(f"Pipeline finished in {time.perf_counter() - start:.2f}s")
+    if any(result in ("failed", "blocked") for result in outcome.values()):
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()